@@ -142,6 +142,21 @@ touch {esc(j.ts)}
 phony("check", check_jobs, desc="Run tests")
 
 
+# Benchmarks take long and have no assertions, so they are not run by `check`.
+@phony(
+    "bench",
+    sorted(
+        path
+        for path in all_files
+        if re.match(os.path.join("^buildpy", "vx", "benchmarks", ".*\\.sh$"), path)
+    ),
+    desc="Run benchmarks",
+)
+def _(j):
+    for bench_sh in j.ds:
+        sh(bench_sh)
+
+
 if __name__ == "__main__":
     dsl.run()
     # print(dsl.dependencies_dot())
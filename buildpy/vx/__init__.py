@@ -3,20 +3,30 @@ import argparse
 import asyncio
 import collections
 import concurrent.futures
+import contextlib
 import datetime
 import functools
+import gc
+import heapq
+import inspect
 import itertools
 import io
 import json
 import logging
 import math
+import multiprocessing
+import multiprocessing.connection
 import os
+import pickle
 import queue
+import re
 import shutil
+import subprocess
 import sys
 import threading
 import time
 import traceback
+import types
 import typing
 import uuid
 
@@ -24,19 +34,43 @@ import psutil
 
 from ._log import logger
 from . import _convenience
+from . import _inotify
 from . import _tval
+from . import _worker
 from . import exception
 from . import resource
 
 
-__version__ = "9.4.0"
+__version__ = "9.5.0"
 T1 = typing.TypeVar("T1")
 T2 = typing.TypeVar("T2")
 TK = typing.TypeVar("TK")
 TV = typing.TypeVar("TV")
 CLOSED = object()
 _PRIORITY_DEFAULT = 0
+_EXECUTORS = ("thread", "process", "remote")
+_N_BYPASSED_MAX = 100
+# Environment variables forwarded to `buildpy-worker` agents unless `--remote_env` is specified.
+_REMOTE_ENV_DEFAULT = ("SHELL", "SHELLOPTS")
+_REMOTE_POLL_INTERVAL = 1.0
+_LOG_CHUNK_SIZE = 4096  # Records of jobs declared by `DSL.files` passed to the logger at once.
+_NO_RESOURCES = types.MappingProxyType(dict())
+_NO_METADATA = types.MappingProxyType(dict())
+_NO_JOBS = ()
+_BYTES_OF_UNIT = dict(K=2**10, M=2**20, G=2**30, T=2**40)
 _CDOTS = "…"
+# Options of `build.py` forwarded by `buildpy.vx_client` to `--server`.
+_CLIENT_ARGS = (
+    "targets",
+    "jobs",
+    "dry_run",
+    "keep_going",
+    "log",
+    "descriptions",
+    "dependencies",
+    "dependencies_dot",
+    "dependencies_json",
+)
 
 # Main
 
@@ -44,6 +78,7 @@ _CDOTS = "…"
 class DSL:
 
     sh = staticmethod(_convenience.sh)
+    ash = staticmethod(_convenience.ash)
     let = staticmethod(_convenience.let)
     loop = staticmethod(_convenience.loop)
     dirname = staticmethod(_convenience.dirname)
@@ -65,19 +100,43 @@ class DSL:
         self.args = _parse_argv(argv[1:])
         assert self.args.jobs > 0
         assert self.args.load_average > 0
+        assert self.args.async_jobs > 0
+        assert self.args.hash_jobs > 0
 
         logger.setLevel(getattr(logging, self.args.log))
         self.job_of_target = _tval.NonOverwritableDict()
         self.jobs_of_key = _tval.TListOf()
+        self._rules = []
+        self._targets_without_rule = set()  # Targets for which all the rules are tried.
+        self._cut = frozenset(self.args.cut)
+        self._job_of_cut_target = dict()
+        self._missing_dep_jobs = set()
+        self._failed_jobs = []  # Retried by `--watch` and `--server`.
+        self._server_args = None  # `self.args` of `--server`.
         self.time_of_dep_cache = _tval.Cache()
         self.metadata = _tval.TDefaultDict()
-        self.event_loop = _event_loop_of()
-        self.executor = _ThreadPoolExecutor(
-            n_max=self.args.jobs,
-            n_serial_max=self.args.n_serial,
-            load_average=self.args.load_average,
+        resource.open_hash_store(
+            self.args.resource_hash_dir, self.args.resource_hash_store
+        )
+        resource.LocalFile.hash_algorithm = self.args.hash_algorithm
+        resource.LocalFile.hash_chunk_size = self.args.hash_chunk_size
+        resource.LocalFile.hash_jobs = self.args.hash_jobs
+        resource.LocalFile.stat_cache = (
+            resource.StatCache() if self.args.stat_cache else None
+        )
+        # Dependencies of a job are hashed in parallel on this pool shared by all jobs.
+        self.hash_executor = (
+            concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.args.hash_jobs, thread_name_prefix="buildpy-hash"
+            )
+            if self.args.hash_jobs > 1
+            else None
         )
+        self.event_loop = _event_loop_of()
+        self.async_semaphore = asyncio.Semaphore(self.args.async_jobs)
         self.deferred_errors = queue.Queue()
+        self._dispatch_lock = threading.Lock()
+        self._finished_cond = threading.Condition(self._dispatch_lock)
         self.got_error = False
         self._cleanuped = False
 
@@ -86,6 +145,15 @@ class DSL:
             if self.args.execution_log_dir_append_id
             else self.args.execution_log_dir
         )
+        if _is_process_worker():
+            # `build.py` is re-executed by a worker of `self.process_executor` only to look up job bodies.
+            self.execution_log_dir = None
+        self.schedule_history_dir = _coalesce(
+            self.args.schedule_history_dir,
+            _convenience.dirname(self.execution_log_dir)
+            if self.execution_log_dir
+            else None,
+        )
         if self.execution_log_dir:
             _convenience.mkdir(self.execution_log_dir)
             with open(_convenience.jp(self.execution_log_dir, "meta.json"), "w") as fp:
@@ -118,6 +186,34 @@ class DSL:
         self.execution_logger_done = _ExecutionLogger(
             self.execution_log_dir, "done.jsonl"
         )
+        self.execution_logger_admission = _ExecutionLogger(
+            self.execution_log_dir, "admission.jsonl"
+        )
+        self.executor = _ThreadPoolExecutor(
+            n_max=self.args.jobs,
+            n_serial_max=self.args.n_serial,
+            load_average=self.args.load_average,
+            n_min=self.args.worker_min,
+            idle_timeout=self.args.worker_idle_timeout,
+            resources=self.args.resource,
+            pressure=self.args.pressure,
+            cpu_percent=self.args.cpu_percent,
+            admission_interval=self.args.admission_interval,
+            admission_log=self.execution_logger_admission.put,
+            learn_mem=self.args.learn_mem,
+        )
+        self.process_executor = _ProcessExecutor(n_max=self.args.jobs)
+        self.remote_executor = (
+            _RemoteExecutor(
+                _worker.address_of_str(self.args.remote_listen),
+                timeout=self.args.remote_timeout,
+                env_names=_coalesce(self.args.remote_env, _REMOTE_ENV_DEFAULT),
+            )
+            if self.args.remote_listen
+            else None
+        )
+        if self.args.executor == "remote" and self.remote_executor is None:
+            raise exception.Err("`--executor remote` requires `--remote_listen`.")
 
     def file(
         self,
@@ -134,12 +230,28 @@ class DSL:
         auto_prefix=None,
         auto_group="_",  # todo: Consider renaming.
         auto_use_ds_structure=False,
+        executor=None,
+        resources=None,
+        mem=None,
     ):
         """Declare a file job.
         Arguments:
             use_hash: Use the file checksum in addition to the modification time.
             serial: Jobs declared as `@file(serial=True)` runs exclusively to each other.
                 The argument maybe useful to declare tasks that require a GPU or large amount of memory.
+            resources: Amounts of named resources consumed by the job (e.g. `dict(mem_gb=32, gpu=1)`).
+                Jobs run only if their total consumption does not exceed the capacities specified by `--resource name=capacity`.
+            mem: Memory footprint of the job in bytes or as a string like `"12G"`.
+                The job starts only if the available memory minus the footprints of the running jobs covers it.
+                With `--learn_mem True`, the peak RSS of previous runs is used for jobs without `mem`.
+            executor: `"thread"`, `"process"`, or `"remote"`.
+                A job declared as `@file(executor="process")` runs its body in a worker process to avoid the GIL.
+                The body should be a module-level function with a unique name, and `j.dsl` is not available in the body.
+                The job falls back to `"thread"` if the body or `j` is not picklable, or on Python < 3.8, where job bodies are not picklable.
+                A job declared as `@file(executor="remote")` runs its body on a `buildpy-worker` agent in the same manner, or forwards `sh` calls in the body to agents if the body is not picklable.
+
+        An `async def` body runs on the event loop of the DSL instead of an executor thread, and `executor`, `serial`, `resources`, and `mem` are ignored.
+        At most `--async_jobs` async bodies run concurrently, independently of `--jobs`.
         """
 
         if cut:
@@ -171,9 +283,97 @@ class DSL:
             data=data,
             key=key,
             ts_prefix=ts_prefix,
+            executor=_coalesce(executor, self.args.executor),
+            resources=resources,
+            mem=mem,
         )
         return j
 
+    def files(
+        self,
+        targets,
+        deps=None,
+        data=None,
+        desc=None,
+        use_hash=None,
+        serial=False,
+        priority=_PRIORITY_DEFAULT,
+        cut=False,
+        key=None,
+        executor=None,
+        resources=None,
+        mem=None,
+    ):
+        """Declare file jobs sharing a body at once.
+
+            @dsl.files([f"out/{i}" for i in range(n)], [[f"in/{i}"] for i in range(n)], data=[dict(i=i) for i in range(n)])
+            def _(j):
+                ...
+
+        Arguments:
+            targets: Targets of each job (a list, or an array with `tolist`).
+            deps: Dependencies of each job, or `None` for no dependencies.
+            data: `data` of each job, or `None`.
+            The other arguments are shared by all jobs and have the same meanings as those of `file`.
+        Return: a list of the jobs, which sets the body of all jobs when called with a function.
+
+        The shared arguments are checked once, and jobs are registered with a single lock acquisition, which is faster than declaring each job by `file` for large graphs.
+        """
+
+        if cut:
+            return _Jobs()
+
+        targets = _list_of_column(targets)
+        n = len(targets)
+        deps = [[]] * n if deps is None else _list_of_column(deps)
+        data = [None] * n if data is None else _list_of_column(data)
+        if not (len(deps) == len(data) == n):
+            raise exception.Err(
+                f"Lengths of targets, deps, and data should be the same: {n}, {len(deps)}, {len(data)}"
+            )
+        use_hash = _coalesce(use_hash, self.args.use_hash)
+        executor = _coalesce(executor, self.args.executor)
+        resources, mem = _FileJob.checked_args(
+            self, executor, serial, resources, mem, f"files({_cdotify(targets)})"
+        )
+        # Allocating many jobs triggers cyclic garbage collections repeatedly, which find nothing to collect here.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            jobs = _Jobs(
+                _FileJob(
+                    None,
+                    ts,
+                    ds,
+                    desc,
+                    use_hash,
+                    serial,
+                    priority=priority,
+                    dsl=self,
+                    data=x,
+                    key=key,
+                    ts_prefix="",
+                    executor=executor,
+                    resources=resources,
+                    mem=mem,
+                    register=False,
+                    checked=True,
+                )
+                for ts, ds, x in zip(targets, deps, data)
+            )
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.job_of_target.update_new((t, j) for j in jobs for t in j.ts_unique)
+        self.jobs_of_key.extend(key, jobs)
+        if self.execution_logger_defined.enabled:
+            # The logger writes a chunk while the next one is built.
+            for i in range(0, n, _LOG_CHUNK_SIZE):
+                self.execution_logger_defined.put_many(
+                    [j.to_execution_log_data() for j in jobs[i : i + _LOG_CHUNK_SIZE]]
+                )
+        return jobs
+
     def phony(
         self,
         target,
@@ -192,31 +392,398 @@ class DSL:
         )
         return j
 
+    def rule(self, pattern):
+        """Declare jobs making targets matching the regular expression `pattern` on demand.
+
+            @dsl.rule(r"out/(\d+)\.txt")
+            def _(m):
+                @dsl.file(m[0], [f"in/{m[1]}.txt"])
+                def _(j):
+                    ...
+
+        The decorated function is called with the `re.Match` of a target when the target is needed but no job makes it.
+        Rules are tried in the order of declaration until one of them declares a job making the target.
+        """
+        regex = re.compile(pattern)
+
+        def deco(f):
+            self._rules.append((regex, f))
+            self._targets_without_rule.clear()
+            return f
+
+        return deco
+
+    def _job_of_target(self, t):
+        # Return `None` if neither a job nor a rule makes `t`, or if the job is cut by `--cut`.
+        j = self.job_of_target.get(t)
+        if j is None and self._rules and t not in self._targets_without_rule:
+            # Rules are not called again for `t`, since jobs declared by them would be declared twice.
+            self._targets_without_rule.add(t)
+            for regex, f in self._rules:
+                m = regex.fullmatch(t) if type(t) is str else None
+                if m is not None:
+                    f(m)
+                    j = self.job_of_target.get(t)
+                    if j is not None:
+                        break
+        if j is not None and self._cut and not self._cut.isdisjoint(j.ts_unique):
+            return None
+        return j
+
     def run(self):
+        if self.args.server:
+            self._serve()
+            return
         if self.args.descriptions:
             _print_descriptions(set(self.job_of_target.values()))
         elif self.args.dependencies:
-            _print_dependencies(set(self.job_of_target.values()))
+            _print_dependencies(_postorder_of(self, self.args.targets))
         elif self.args.dependencies_dot:
             print(self.dependencies_dot())
         elif self.args.dependencies_json:
             print(self.dependencies_json())
         else:
+            if self.args.schedule == "critical-path" or self.args.learn_mem:
+                history = _history_of(
+                    self.schedule_history_dir, self.args.schedule_history, self.args.id
+                )
+                if self.args.schedule == "critical-path":
+                    _set_ranks(self, self.args.targets, history)
+                if self.args.learn_mem:
+                    _set_mem_estimates(self, self.args.targets, history)
+            if self.remote_executor is not None:
+                self.remote_executor.start()
             try:
-                for target in self.args.targets:
-                    self.job_of_target[target].invoke()
-                for target in self.args.targets:
-                    self.job_of_target[target].wait()
+                roots = [self._root_of(t) for t in self.args.targets]
+                if self.args.watch:
+                    self._watch(roots)
+                else:
+                    self._build(roots)
             except KeyboardInterrupt as e:
                 self._cleanup()
                 raise
-            if self.deferred_errors.qsize() > 0:
-                logger.error("Following errors have thrown during the execution")
-                for _ in range(self.deferred_errors.qsize()):
-                    j, e_str = self.deferred_errors.get()
-                    logger.error(e_str)
-                    logger.error(j)
-                raise exception.Err("Execution failed.")
+
+    def _build(self, roots):
+        # Resources could have been changed since the last build of `--watch` or `--server`.
+        resource.clear_caches()
+        self._invoke(roots)
+        for j in roots:
+            j.wait()
+        # Later runs read `executed.jsonl` to learn durations and memory footprints.
+        self.execution_logger_executed.flush()
+        resource.flush_hash_stores()
+        if self.deferred_errors.qsize() > 0:
+            logger.error("Following errors have thrown during the execution")
+            for _ in range(self.deferred_errors.qsize()):
+                j, e_str = self.deferred_errors.get()
+                logger.error(e_str)
+                logger.error(j)
+            raise exception.Err("Execution failed.")
+
+    def _watch(self, roots):
+        """
+        Build `roots`, then rebuild jobs downstream of local sources changed since the last build until interrupted.
+        Local targets removed or edited by others make the jobs making them and the jobs downstream of them checked again.
+        Times of unchanged resources are kept in `time_of_dep_cache`, so only the changed resources and the targets of the rebuilt jobs are checked again.
+        """
+        watcher = _SourceWatcher(self)
+        try:
+            try:
+                self._build(roots)
+            except exception.Err as e:
+                logger.error(e)
+            watcher.add(_postorder_of(self, self.args.targets))
+            while True:
+                logger.info(
+                    "Watching %d directories for %d sources and %d targets",
+                    watcher.n_dirs,
+                    len(watcher.sources_of_path),
+                    len(watcher.targets_of_path),
+                )
+                changed = set()
+                while not changed:  # Other files in the directories are changed.
+                    changed = watcher.changed_of(
+                        watcher.inotify.wait(self.args.watch_debounce)
+                    )
+                affected = watcher.invalidate(changed)
+                logger.info(
+                    "Rebuilding %d jobs affected by %s", len(affected), sorted(changed)
+                )
+                self._reset(affected)
+                try:
+                    self._build(roots)
+                except exception.Err as e:
+                    logger.error(e)
+                watcher.ignore_targets()
+        finally:
+            watcher.close()
+
+    def _serve(self):
+        """
+        Serve requests of `buildpy.vx_client` on the Unix socket `--server` one at a time, keeping the declared jobs and the caches in memory.
+        Changes of local sources and targets between requests are tracked as `--watch` does, so jobs finished by previous requests are not checked again unless they make or are downstream of the changes.
+        Resources other than local files are not watched, so jobs making or depending on them, and the jobs downstream of them, are checked again by every request.
+        The server re-executes itself to declare jobs again when `build.py` or a module it imported is changed.
+        """
+        if os.path.exists(self.args.server):
+            try:
+                multiprocessing.connection.Client(self.args.server).close()
+            except OSError:
+                os.remove(self.args.server)  # Left by a dead server.
+            else:
+                raise exception.Err(f"A server is running on {self.args.server}")
+        mtime_of_module = _mtime_of_module()
+        self._server_args = self.args
+        watcher = _SourceWatcher(self)
+        jobs_of_targets = dict()
+        listener = multiprocessing.connection.Listener(self.args.server, "AF_UNIX")
+        # Only the owner can connect.
+        # `os.umask` is not used since it affects files created by other threads.
+        os.chmod(self.args.server, 0o600)
+        if self.remote_executor is not None:
+            self.remote_executor.start()
+        logger.info("Serving on %s", self.args.server)
+        try:
+            while True:
+                with listener.accept() as conn:
+                    try:
+                        kind, x = conn.recv()
+                    except (EOFError, OSError):
+                        continue
+                    if _is_module_changed(mtime_of_module):
+                        # The socket is removed first so that the client reconnecting is not accepted by this server.
+                        listener.close()
+                        conn.send(("restart", None))
+                        try:
+                            conn.recv()  # Wait for the client to close the connection.
+                        except (EOFError, OSError):
+                            pass
+                        break
+                    if kind != "run" or x["cwd"] != os.getcwd():
+                        conn.send(
+                            (
+                                "exit",
+                                f"The server runs in {os.getcwd()}: {kind}, {x}",
+                            )
+                        )
+                        continue
+                    with _output_to(conn):
+                        code = self._serve_request(x["argv"], watcher, jobs_of_targets)
+                    conn.send(("exit", code))
+        finally:
+            listener.close()
+            watcher.close()
+            self.execution_logger_executed.flush()
+            resource.flush_hash_stores()
+        logger.info("Restarting since modules are changed")
+        os.execv(sys.executable, [sys.executable, *sys.argv])
+
+    def _serve_request(self, argv, watcher, jobs_of_targets):
+        """
+        Run `argv` of a client with the options of the server except `_CLIENT_ARGS`.
+        Return: the exit status.
+        """
+        try:
+            args = _parse_argv(argv)
+        except SystemExit as e:  # `--help` or an invalid option.
+            return e.code
+        key = tuple(args.targets)
+        if key not in jobs_of_targets:
+            jobs_of_targets[key] = _postorder_of(self, args.targets)
+            watcher.add(jobs_of_targets[key])
+        jobs = jobs_of_targets[key]
+        self.args = argparse.Namespace(
+            **{
+                **vars(self._server_args),
+                **{k: getattr(args, k) for k in _CLIENT_ARGS},
+                "server": None,
+            }
+        )
+        logger.setLevel(getattr(logging, self.args.log))
+        not_invoked = []
+        try:
+            self.executor.resize(self.args.jobs)
+            changed = watcher.changed_of(watcher.inotify.drain())
+            if changed:
+                logger.info("%s are changed", sorted(changed))
+            # Resources other than local files are not watched, so they are checked by every request as a cold run does.
+            changed.update(watcher.remote_resources)
+            affected = watcher.invalidate(changed) if changed else ()
+            if affected:
+                logger.info("%d jobs are checked again", len(affected))
+            self._reset(affected)
+            if self.args.dry_run:
+                # Jobs are not executed by the dry-run, so those invoked by it are invoked again.
+                not_invoked = [j for j in jobs if not j.invoked]
+            self.run()
+            return 0
+        except exception.Err as e:
+            logger.error(e)
+            return 1
+        except Exception:
+            logger.error(_str_of_exception())
+            return 1
+        finally:
+            if self.args.dry_run:
+                self._reset(j for j in not_invoked if j.invoked)
+            watcher.ignore_targets()
+            self.args = self._server_args
+
+    def _reset(self, jobs):
+        """
+        Make `jobs` and the failed jobs invoked again, and forget the times of their targets.
+        """
+        jobs = set(jobs)
+        jobs.update(self._failed_jobs)
+        self._failed_jobs.clear()
+        for j in jobs:
+            j._reset()
+            for t in j.ts_unique:
+                self.time_of_dep_cache.invalidate(t)
+        self.got_error = False
+
+    def _invoke(self, roots):
+        """
+        Compile the subgraph reachable from `roots`, and dispatch each job when all of its dependencies finish.
+        Jobs invoked before are not compiled again.
+        The compilation is an iterative DFS, so neither deep graphs nor cycles exhaust the stack.
+        """
+        ready = []
+        with self._dispatch_lock:
+            # Jobs on the path from a root to the current job, in order.
+            # A job is removed only after all jobs added after it are removed.
+            on_path = dict()
+            stack = [(j, False) for j in reversed(roots)]
+            while stack:
+                j, expanded = stack.pop()
+                if expanded:
+                    del on_path[j]
+                    for child in j._children:
+                        if child._finished:
+                            j._blocked = j._blocked or not child.successed
+                        else:
+                            j._n_pending += 1
+                            child._dependents.append(j)
+                    if j._n_pending < 1:
+                        ready.append(j)
+                    continue
+                if j.invoked:
+                    continue
+                j.invoked = True
+                j.log(self.execution_logger_invoked)
+                on_path[j] = None
+                stack.append((j, True))
+                children = dict()  # Preserve the order.
+                for d in j.ds_unique:
+                    child = self._job_of_target(d)
+                    if child is None:
+                        child = self._job_of_missing_dep(d)
+                    if child in on_path:
+                        path = list(on_path)
+                        cycle = path[path.index(child) :] + [child]
+                        raise exception.Err(
+                            "A circular dependency detected: "
+                            + " -> ".join(str(_cdotify(x.ts_unique)) for x in cycle)
+                        )
+                    children[child] = None
+                j._children = list(children)
+                j._dependents = []
+                for child in reversed(children):
+                    if not child.invoked:
+                        stack.append((child, False))
+        self._dispatch(ready)
+
+    def _dispatch(self, ready):
+        finished = []
+        for j in ready:
+            if j._blocked:
+                finished.append(j)
+            elif inspect.iscoroutinefunction(j.f):
+                j.log(self.execution_logger_enqueued, rank=j.rank)
+                self.event_loop.call_soon_threadsafe(
+                    self.event_loop.create_task, j._arun()
+                )
+            else:
+                j.log(self.execution_logger_enqueued, rank=j.rank)
+                self.executor.submit(j._to_work_item())
+        if finished:
+            self._finish(finished)
+
+    def _finish(self, finished):
+        """
+        Mark `finished` jobs done, and dispatch their dependents whose dependencies are all done.
+        Dependents of a failed job are marked done without running.
+        """
+        ready = []
+        with self._dispatch_lock:
+            while finished:
+                j = finished.pop()
+                j._finished = True
+                if not j.successed:
+                    self._failed_jobs.append(j)
+                for parent in j._dependents:
+                    parent._blocked = parent._blocked or not j.successed
+                    parent._n_pending -= 1
+                    if parent._n_pending < 1:
+                        if parent._blocked:
+                            finished.append(parent)
+                        else:
+                            ready.append(parent)
+                j._release()
+            self._finished_cond.notify_all()
+        self._dispatch(ready)
+
+    def _root_of(self, t):
+        j = self._job_of_target(t)
+        if j is None:
+            if t not in self.job_of_target:
+                raise exception.Err(f"No rule to make {t}")
+            j = self._job_of_missing_dep(t)
+        return j
+
+    def _job_of_missing_dep(self, d):
+        # Metadata given to `d` by its consumers, such as a credential, is kept.
+        meta = {**self.metadata[d], "keep": True}
+        if d in self.job_of_target:
+            # The job making `d` is cut by `--cut`, so `d` is treated as a source, which is not registered to keep the declared job.
+            if d not in self._job_of_cut_target:
+                j = _FileJob(
+                    None,
+                    [self.meta(d, **meta)],
+                    [],
+                    None,
+                    self.args.use_hash,
+                    False,
+                    priority=_PRIORITY_DEFAULT,
+                    dsl=self,
+                    data=None,
+                    key=None,
+                    ts_prefix="",
+                    register=False,
+                )
+
+                @j
+                def _(j):
+                    raise exception.Err(f"{d} does not exist but its job is cut")
+
+                self._job_of_cut_target[d] = j
+            return self._job_of_cut_target[d]
+
+        @self.file([self.meta(d, **meta)], [])
+        def _(j):
+            raise exception.Err(f"No rule to make {d}")
+
+        j = self.job_of_target[d]
+        self._missing_dep_jobs.add(j)
+        return j
+
+    def on_worker_start(self, f):
+        """Register `f()` to be called in each executor thread when the thread starts."""
+        return self.executor.on_start(f)
+
+    def on_worker_stop(self, f):
+        """Register `f()` to be called in each executor thread just before the thread exits."""
+        return self.executor.on_stop(f)
 
     def meta(self, uri, **kwargs):
         self.metadata[uri] = kwargs
@@ -238,16 +805,23 @@ class DSL:
             raise NotImplementedError(f"rm({repr(uri)}) is not supported")
 
     def dependencies_json(self):
-        return _dependencies_json_of(set(self.job_of_target.values()))
+        """Return the dependencies of the jobs reachable from the requested targets in the JSON format."""
+        return _dependencies_json_of(_postorder_of(self, self.args.targets))
 
     def dependencies_dot(self):
-        return _dependencies_dot_of(set(self.job_of_target.values()))
+        """Return the dependencies of the jobs reachable from the requested targets in the DOT format."""
+        return _dependencies_dot_of(_postorder_of(self, self.args.targets))
 
     def _cleanup(self):
         if self._cleanuped:
             return
         self._cleanuped = True
         self.executor.shutdown(wait=False)
+        self.process_executor.shutdown(wait=False)
+        if self.hash_executor is not None:
+            self.hash_executor.shutdown(wait=False)
+        if self.remote_executor is not None:
+            self.remote_executor.shutdown()
         self.event_loop.call_soon_threadsafe(self.event_loop.stop)
         # self.event_loop.call_soon_threadsafe(self.event_loop.close)
         if self.args.terminate_subprocesses:
@@ -262,6 +836,130 @@ class DSL:
 # Internal use only.
 
 
+class _SourceWatcher:
+    """
+    Watch local sources, resources not made by jobs, and local targets with inotify, and find the jobs affected by changes of them.
+    Changes of targets made by builds are ignored by `ignore_targets`, so only targets removed or edited by others make their jobs checked again.
+    """
+
+    def __init__(self, dsl):
+        self.dsl = dsl
+        self.inotify = _inotify.Inotify()
+        self.n_dirs = 0
+        self.dependents_of = collections.defaultdict(list)
+        self.sources_of_path = collections.defaultdict(set)
+        self.targets_of_path = collections.defaultdict(set)
+        self._jobs = set()
+        self._changed_sources = set()  # Sources changed during the last build.
+        self._unwatched = set()  # Targets in directories not made yet.
+        self.remote_resources = set()  # Resources other than local files.
+
+    def add(self, jobs):
+        """
+        Watch the sources and the targets of `jobs`.
+        """
+        paths = set()
+        for j in jobs:
+            if j in self._jobs:
+                continue
+            self._jobs.add(j)
+            for d in j.ds_unique:
+                self.dependents_of[d].append(j)
+                path = self._path_of(d)
+                if path is None:
+                    self.remote_resources.add(d)
+                    continue
+                child = self.dsl._job_of_target(d)
+                if child is None or child in self.dsl._missing_dep_jobs:
+                    self.sources_of_path[path].add(d)
+                    paths.add(path)
+            if j in self.dsl._missing_dep_jobs:
+                continue
+            for t in j.ts_unique:
+                path = self._path_of(t)
+                if path is None:
+                    self.remote_resources.add(t)
+                else:
+                    self.targets_of_path[path].add(t)
+                    paths.add(path)
+                    if not os.path.isdir(os.path.dirname(path)):
+                        self._unwatched.add(path)
+        self.n_dirs += _watch_dirs(self.inotify, paths)
+
+    def changed_of(self, paths):
+        """
+        Return: the sources and the targets changed by changes of `paths`, and the sources changed during the last build.
+        """
+        changed = self._changed_sources
+        self._changed_sources = set()
+        for path in paths:
+            changed.update(self._resources_of(path, self.sources_of_path))
+            changed.update(self._resources_of(path, self.targets_of_path))
+        return changed
+
+    def ignore_targets(self):
+        """
+        Forget changes of targets made by the build just finished, keeping changes of sources for the next build.
+        """
+        for path in self.inotify.drain():
+            self._changed_sources.update(
+                self._resources_of(path, self.sources_of_path)
+            )
+        made = {p for p in self._unwatched if os.path.isdir(os.path.dirname(p))}
+        if made:
+            self._unwatched -= made
+            self.n_dirs += _watch_dirs(self.inotify, made)
+
+    def _path_of(self, x):
+        puri = self.dsl.uriparse(x)
+        if puri.scheme != "file":
+            return None
+        return os.path.abspath(puri.uri)
+
+    @staticmethod
+    def _resources_of(path, resources_of_path):
+        if path is None:  # Events are lost.
+            return set().union(*resources_of_path.values())
+        resources = set()
+        # Changes in a directory change the directory.
+        while True:
+            resources.update(resources_of_path.get(path, ()))
+            parent = os.path.dirname(path)
+            if parent == path:
+                return resources
+            path = parent
+
+    def invalidate(self, changed):
+        """
+        Forget the times of `changed` sources and targets, and the targets downstream of them.
+        Return: the jobs making or depending on them.
+        """
+        affected = set()
+        stack = list(changed)
+        paths = set()
+        for d in changed:
+            # Jobs making targets changed, or treating sources as targets, check their existence.
+            j = self.dsl._job_of_target(d) or self.dsl._job_of_cut_target.get(d)
+            if j is not None:
+                affected.add(j)
+            path = self._path_of(d)
+            if path is not None:
+                paths.add(path)
+        # Directories created in the sources are watched.
+        self.n_dirs += _watch_dirs(self.inotify, paths)
+        while stack:
+            d = stack.pop()
+            self.dsl.time_of_dep_cache.invalidate(d)
+            for j in self.dependents_of.get(d, ()):
+                if j not in affected:
+                    affected.add(j)
+                    stack.extend(j.ts_unique)
+        return affected
+
+    def close(self):
+        self.inotify.close()
+
+
 class _ExecutionLogger:
     def __init__(self, dir_, file):
         if dir_:
@@ -273,58 +971,115 @@ class _ExecutionLogger:
             self.processor = threading.Thread(target=self._worker, daemon=True)
             self.processor.start()
         else:
-            self.queue = queue.Queue(maxsize=0)  # to support `al.queue.put(x)`
+            self.processor = None
+        self.enabled = self.processor is not None
+
+    def put(self, x):
+        if self.enabled:
+            self.queue.put((x,))
+
+    def put_many(self, xs):
+        # Records are written with a single flush.
+        if self.enabled:
+            self.queue.put(xs)
 
     def _worker(self):
         while True:
-            x = self.queue.get(block=True)
-            x = _set_unique(x, "t", datetime.datetime.utcnow().isoformat())
-            x = _set_unique(x, "i", next(self.counter))
-            json.dump(x, self.fp, ensure_ascii=False, sort_keys=True)
-            self.fp.write("\n")
+            xs = self.queue.get(block=True)
+            for x in xs:
+                x = _set_unique(x, "t", datetime.datetime.utcnow().isoformat())
+                x = _set_unique(x, "i", next(self.counter))
+                json.dump(x, self.fp, ensure_ascii=False, sort_keys=True)
+                self.fp.write("\n")
             self.fp.flush()
+            self.queue.task_done()
+
+    def flush(self):
+        if self.processor is not None:
+            self.queue.join()
 
 
 class _Job:
-    def __init__(self, f, ts, ds, desc, priority, dsl, data, key):
-        self.done = threading.Event()
-        self.adone = asyncio.Event()
+    # Millions of jobs could be declared, so keep them compact.
+    __slots__ = (
+        "executed",
+        "successed",
+        "serial",
+        "resources",
+        "mem",
+        "mem_estimated",
+        "executor",
+        "metadata",
+        "f",
+        "ts",
+        "ds",
+        "ts_unique",
+        "ds_unique",
+        "desc",
+        "priority",
+        "rank",
+        "dsl",
+        "key",
+        "invoked",
+        "data",
+        "_children",
+        "_dependents",
+        "_n_pending",
+        "_blocked",
+        "_finished",
+    )
+
+    def __init__(
+        self,
+        f,
+        ts,
+        ds,
+        desc,
+        priority,
+        dsl,
+        data,
+        key,
+        serial=False,
+        resources=None,
+        mem=0,
+        executor="thread",
+        register=True,
+    ):
         self.executed = False  # This flag is used to propagate dry-run.
         self.successed = False  # True if self.execute did not raise an error
-        self.serial = False
-        self.metadata = _tval.TDefaultDict()
+        self.serial = serial
+        self.resources = resources or _NO_RESOURCES
+        self.mem = mem
+        self.mem_estimated = 0  # Peak RSS in previous runs.
+        self.executor = executor
 
+        metadata = dict()
         self.f = f
-        self.ts = _de_with_meta(self.metadata, ts)
-        self.ds = _de_with_meta(self.metadata, ds)
-        self.ts_unique = _unique_of(self.ts)
-        self.ds_unique = _unique_of(self.ds)
+        self.ts, self.ts_unique = _de_and_unique_of(metadata, ts)
+        self.ds, self.ds_unique = _de_and_unique_of(metadata, ds)
+        self.metadata = metadata or _NO_METADATA
         self.desc = desc
         self.priority = priority
+        self.rank = 0.0  # Estimated duration of the longest path to a requested target.
         self.dsl = dsl
         self.key = key
 
         self.invoked = False
-        self.run_future = None
-
-        for t in self.ts_unique:
-            self.dsl.job_of_target[t] = self
-        self.dsl.jobs_of_key.append(key, self)
+        # States of the compiled graph (see `DSL._invoke`).
+        self._children = _NO_JOBS
+        self._dependents = _NO_JOBS
+        self._n_pending = 0
+        self._blocked = False  # True if any dependency failed.
+        self._finished = False
 
         # User data.
         self.data = data
-        self._execution_log_data = _convenience.dictify(
-            dict(
-                data=self.data,
-                desc=self.desc,
-                ds=self.ds,
-                priority=self.priority,
-                serial=self.serial,
-                ts=self.ts,
-                key=self.key,
-            )
-        )
-        dsl.execution_logger_defined.queue.put(self.to_execution_log_data())
+
+        if register:  # `DSL.files` registers jobs at once.
+            for t in self.ts_unique:
+                self.dsl.job_of_target[t] = self
+            self.dsl.jobs_of_key.append(key, self)
+            self.log(dsl.execution_logger_defined)
 
     def __repr__(self):
         return f"{type(self).__name__}({_cdotify(self.ts_unique)}, {_cdotify(self.ds_unique)})"
@@ -334,24 +1089,69 @@ class _Job:
         return self
 
     def __lt__(self, other):
-        return (self.serial and not other.serial) or self.priority < other.priority
+        return (self.serial and not other.serial) or (-self.rank, self.priority) < (
+            -other.rank,
+            other.priority,
+        )
 
-    def execute(self):
+    def execute(self, meter=None):
+        logger.debug(self)
+        assert not self._finished, self
+        t1 = time.monotonic()
+        remote = []
+        if self.dsl.args.dry_run:
+            self.write()
+        else:
+            try:
+                if self.executor == "process":
+                    self.dsl.process_executor.run(self)
+                elif self.executor == "remote":
+                    self.dsl.remote_executor.run(self, remote)
+                elif meter is None:
+                    self.f(self)
+                else:
+                    with _convenience.observe_popen(meter.add):
+                        self.f(self)
+            finally:
+                self._invalidate_targets()
+        t2 = time.monotonic()
+        x = dict(elapsed=t2 - t1)
+        if meter is not None:
+            x["peak_rss"] = meter.peak
+        if self.executor == "remote" and not self.dsl.args.dry_run:
+            x["remote"] = remote
+        self.log(self.dsl.execution_logger_executed, **x)
+
+    async def aexecute(self):
         logger.debug(self)
-        assert not self.done.is_set(), self
-        assert not self.adone.is_set(), self
+        assert not self._finished, self
+        t1 = time.monotonic()
         if self.dsl.args.dry_run:
             self.write()
         else:
-            self.f(self)
-        self.dsl.execution_logger_executed.queue.put(self.to_execution_log_data())
+            try:
+                await self.f(self)
+            finally:
+                self._invalidate_targets()
+        t2 = time.monotonic()
+        self.log(self.dsl.execution_logger_executed, elapsed=t2 - t1)
 
     def rm_targets(self):
         pass
 
+    def _invalidate_targets(self):
+        # Targets are (re)created by the job body.
+        for t in self.ts_unique:
+            scheme = _convenience.uriparse(t).scheme
+            if scheme in resource.of_scheme:
+                resource.of_scheme[scheme].invalidate(t)
+
     def need_update(self):
         return True
 
+    async def aneed_update(self):
+        return self.need_update()
+
     def write(self, file=sys.stdout):
         logger.debug(self)
         for t in self.ts_unique:
@@ -361,77 +1161,112 @@ class _Job:
         print(file=file)
 
     def invoke(self):
-        self.dsl.event_loop.call_soon_threadsafe(
-            self.dsl.event_loop.create_task, self.ainvoke(())
-        )
+        self.dsl._invoke([self])
         return self
 
     def wait(self):
-        # We can just wait a threading.Event since `wait` is called only in the main thread or an executor, and no event loop will be block by the call.
+        # We can just wait a threading.Condition since `wait` is called only in the main thread or an executor, and no event loop will be block by the call.
         logger.debug(self)
-        while not self.done.wait(timeout=1):
-            pass
+        with self.dsl._finished_cond:
+            while not self._finished:
+                self.dsl._finished_cond.wait(timeout=1)
 
     def to_execution_log_data(self):
-        return {"successed": self.successed, **self._execution_log_data}
-
-    async def ainvoke(self, call_chain):
-        # This coroutine runs inside self.dsl.event_loop.
-        logger.debug(self)
-        if not self.invoked:
-            self.invoked = True
-            self.dsl.execution_logger_invoked.queue.put(self.to_execution_log_data())
-            if _contains(self, call_chain):
-                raise exception.Err(
-                    f"A circular dependency detected: {self} for {call_chain}"
-                )
-            cc = (self, call_chain)
-            children = []
-            for d in self.ds_unique:
-                try:
-                    child = self.dsl.job_of_target[d]
-                except KeyError:
+        return _convenience.dictify(
+            dict(
+                data=self.data,
+                desc=self.desc,
+                ds=self.ds,
+                priority=self.priority,
+                serial=self.serial,
+                successed=self.successed,
+                ts=self.ts,
+                key=self.key,
+            )
+        )
 
-                    @_convenience.let
-                    def _(d=d):
-                        @self.dsl.file([self.dsl.meta(d, keep=True)], [])
-                        def _(j):
-                            raise exception.Err(f"No rule to make {d}")
-
-                    child = self.dsl.job_of_target[d]
-                self.dsl.event_loop.create_task(child.ainvoke(cc))
-                children.append(child)
-            for child in children:
-                await child.adone.wait()
-            if all(child.successed for child in children):
-                self.dsl.event_loop.run_in_executor(
-                    self.dsl.executor, self._to_work_item()
-                )
-                self.dsl.execution_logger_enqueued.queue.put(
-                    self.to_execution_log_data()
-                )
-            else:
-                # todo: Move the done calls into j._enq() or a function therein.
-                # Order matters.
-                self.done.set()
-                self.adone.set()
+    def log(self, execution_logger, **kwargs):
+        # Build the log data only if it is written.
+        if execution_logger.enabled:
+            execution_logger.put({**self.to_execution_log_data(), **kwargs})
+
+    def _release(self):
+        # Release what is unnecessary after the job finished.
+        if not (self.dsl.args.watch or self._is_served()):  # They run jobs again.
+            self.f = None
+            self.data = None
+        self._children = _NO_JOBS
+        self._dependents = _NO_JOBS
+
+    def _is_served(self):
+        # Requests of `--server` leave `DSL.args.server` unset.
+        return self.dsl._server_args is not None
+
+    def _reset(self):
+        # Make the job invoked again by `DSL._invoke`.
+        self.executed = False
+        self.successed = False
+        self.invoked = False
+        self._n_pending = 0
+        self._blocked = False
+        self._finished = False
 
     def _to_work_item(self):
         return _WorkItem(self)
 
+    async def _arun(self):
+        # The counterpart of `_WorkItem._run` for an `async def` body.
+        t_submitted = time.monotonic()
+        async with self.dsl.async_semaphore:
+            t_wait = time.monotonic() - t_submitted
+            if self.dsl.got_error:
+                logger.debug("Early return by an error %s", self)
+                if self._is_served():
+                    self.dsl._finish([self])
+                return
+            try:
+                logger.debug("Running %s", self)
+                try:
+                    need_update = await self.aneed_update()
+                except Exception:
+                    need_update = None
+                    self.post_exception()
+                if need_update:
+                    try:
+                        await self.aexecute()
+                        self.executed = True
+                        self.successed = True
+                    except Exception:
+                        self.post_exception()
+                else:
+                    self.executed = False
+                    self.successed = need_update is not None
+                self.log(self.dsl.execution_logger_done, wait=t_wait)
+                self.dsl._finish([self])
+            except Exception:  # Propagate Exception caused by a bug in buildpy code to the main thread.
+                e_str = _str_of_exception()
+                self.dsl.die(e_str)
+
     def post_exception(self):
         logger.error(self)
         e_str = _str_of_exception()
         self.rm_targets()
-        if self.dsl.args.keep_going:
+        if self.dsl.args.keep_going or self.dsl.args.watch:
             logger.error(e_str)
             self.dsl.deferred_errors.put((self, e_str))
+        elif self._is_served():
+            # Jobs not started yet are skipped, and the server keeps running.
+            logger.error(e_str)
+            self.dsl.got_error = True
+            self.dsl.deferred_errors.put((self, e_str))
         else:
             self.dsl.got_error = True
             self.dsl.die(e_str)
 
 
 class _PhonyJob(_Job):
+    __slots__ = ()
+
     def __init__(self, f, ts, ds, desc, priority, dsl, data, key):
         if len(_unique_of(ts)) != 1:
             raise exception.Err(
@@ -441,13 +1276,69 @@ class _PhonyJob(_Job):
 
 
 class _FileJob(_Job):
+    __slots__ = ("_use_hash", "ts_prefix")
+
     def __init__(
-        self, f, ts, ds, desc, use_hash, serial, priority, dsl, data, key, ts_prefix
+        self,
+        f,
+        ts,
+        ds,
+        desc,
+        use_hash,
+        serial,
+        priority,
+        dsl,
+        data,
+        key,
+        ts_prefix,
+        executor="thread",
+        resources=None,
+        mem=None,
+        register=True,
+        checked=False,
     ):
-        super().__init__(f, ts, ds, desc, priority, dsl=dsl, data=data, key=key)
+        if not checked:  # `DSL.files` checks the arguments shared by its jobs once.
+            resources, mem = self.checked_args(
+                dsl, executor, serial, resources, mem, f"{ts}, {ds}"
+            )
         self._use_hash = use_hash
-        self.serial = serial
         self.ts_prefix = ts_prefix
+        super().__init__(
+            f,
+            ts,
+            ds,
+            desc,
+            priority,
+            dsl=dsl,
+            data=data,
+            key=key,
+            serial=serial,
+            resources=resources,
+            mem=mem,
+            executor=executor,
+            register=register,
+        )
+
+    @staticmethod
+    def checked_args(dsl, executor, serial, resources, mem, where):
+        """
+        Return: `(resources, mem)` normalized for `_FileJob(checked=True)`.
+        Raise: `exception.Err` mentioning `where` if the arguments are invalid.
+        """
+        if executor not in _EXECUTORS:
+            raise exception.Err(
+                f"executor should be one of {_EXECUTORS}: {executor}, {where}"
+            )
+        if executor == "remote" and dsl.remote_executor is None:
+            raise exception.Err(f"executor='remote' requires `--remote_listen`: {where}")
+        resources = dict(_coalesce(resources, dict()))
+        if serial:
+            resources["serial"] = 1
+        try:
+            dsl.executor.check_resources(resources)
+        except ValueError as e:
+            raise exception.Err(f"{e}: {where}")
+        return resources, _bytes_of(_coalesce(mem, 0))
 
     def __repr__(self):
         return f"{type(self).__name__}({_cdotify(self.ts_unique)}, {_cdotify(self.ds_unique)}, serial={self.serial})"
@@ -472,15 +1363,26 @@ class _FileJob(_Job):
                     pass
         return self._need_update()
 
+    async def aneed_update(self):
+        # Checking the modification times and hashes is blocking, so it runs in the default executor of the event loop.
+        return await asyncio.get_running_loop().run_in_executor(None, self.need_update)
+
     def _need_update(self):
         # Intentionally create hash caches for the all set(self.ds).
+        if (
+            self._use_hash
+            and self.dsl.hash_executor is not None
+            and len(self.ds_unique) > 1
+        ):
+            # `time_of_dep_cache` computes the value of each dependency only once even if jobs sharing it run concurrently.
+            ts_dep = self.dsl.hash_executor.map(
+                self._time_of_dep_from_cache, self.ds_unique
+            )
+        else:
+            ts_dep = map(self._time_of_dep_from_cache, self.ds_unique)
         t_ds = -float("inf")
-        for d in self.ds_unique:
-            t = self._time_of_dep_from_cache(d)
-            if (
-                "check_existence_only" in self.metadata[d]
-                and self.metadata[d]["check_existence_only"]
-            ):
+        for d, t in zip(self.ds_unique, ts_dep):
+            if self.metadata.get(d, _NO_METADATA).get("check_existence_only"):
                 t = -float("inf")
             if t > t_ds:
                 t_ds = t
@@ -627,8 +1529,14 @@ class _WorkItem:
     def __init__(self, j):
         self.j = j
         self.future = concurrent.futures.Future()
-        self.serial = j.serial
+        self.resources = j.resources
+        self.mem = j.mem or j.mem_estimated
+        self.meter = _MemoryMeter() if j.dsl.args.learn_mem else None
         self.priority = j.priority
+        self.n_bypassed = 0
+        self.t_submitted = None
+        self.t_wait = None
+        self.seq = 0  # Work items of the same priority start in the order of submission.
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.j})"
@@ -646,6 +1554,8 @@ class _WorkItem:
     def _run(self):
         if self.j.dsl.got_error:
             logger.debug("Early return by an error %s", self.j)
+            if self.j._is_served():
+                self.j.dsl._finish([self.j])
             return
         try:
             logger.debug("Running %s", self.j)
@@ -656,7 +1566,7 @@ class _WorkItem:
                 self.j.post_exception()
             if need_update:
                 try:
-                    self.j.execute()
+                    self.j.execute(meter=self.meter)
                     self.j.executed = True
                     self.j.successed = True
                 except Exception:
@@ -667,90 +1577,715 @@ class _WorkItem:
                     self.j.successed = False
                 else:
                     self.j.successed = True
-            self.j.done.set()
-            self.j.dsl.event_loop.call_soon_threadsafe(self.j.adone.set)
-            self.j.dsl.execution_logger_done.queue.put(self.j.to_execution_log_data())
+            self.j.log(self.j.dsl.execution_logger_done, wait=self.t_wait)
+            self.j.dsl._finish([self.j])
         except Exception:  # Propagate Exception caused by a bug in buildpy code to the main thread.
             e_str = _str_of_exception()
             self.j.dsl.die(e_str)
 
     def __lt__(self, other):
-        return self.j < other.j
+        if self.j < other.j:
+            return True
+        elif other.j < self.j:
+            return False
+        return self.seq < other.seq
 
 
 class _ThreadPoolExecutor:
-    def __init__(self, n_max, n_serial_max, load_average):
+    """
+    Worker threads are kept alive for `idle_timeout` seconds after they become idle so that short jobs reuse them (and their thread-local states such as the cached clients of `resource`).
+    At least `n_min` threads are kept warm once the first work item is submitted.
+
+    A work item consuming `wi.resources` starts only if the consumption fits the remaining `resources` capacity.
+    Serial jobs consume one unit of the `"serial"` resource, whose capacity is `n_serial_max`.
+    Resources without capacity are unlimited.
+    A waiting work item does not block lower-priority work items that fit (backfilling) unless it has been bypassed `_N_BYPASSED_MAX` times.
+    Whether a work item fits depends only on its consumption, so work items consuming resources are queued in a heap per consumption, and only the head of each heap is examined.
+
+    No work item starts while `self.admission` rejects new jobs, except when nothing is running.
+    A work item with `wi.mem` starts only if the available memory minus `wi.mem` of the running work items covers it, except when nothing is running.
+    """
+
+    def __init__(
+        self,
+        n_max,
+        n_serial_max,
+        load_average,
+        n_min=0,
+        idle_timeout=10.0,
+        resources=None,
+        pressure=None,
+        cpu_percent=float("inf"),
+        admission_interval=1.0,
+        admission_log=None,
+        learn_mem=False,
+    ):
         if n_max < 1:
             raise ValueError(f"n_max = {n_max} should be greater than 0")
         if n_serial_max < 1:
             raise ValueError(f"n_serial_max = {n_serial_max} should be greater than 0")
+        if not (0 <= n_min <= n_max):
+            raise ValueError(f"n_min = {n_min} should be in [0, {n_max}]")
+        if idle_timeout < 0:
+            raise ValueError(f"idle_timeout = {idle_timeout} should not be negative")
         self._n_max = n_max
-        self._load_average = load_average
+        self._n_min = n_min
+        self._idle_timeout = idle_timeout
+        self.capacity = {**_coalesce(resources, dict()), "serial": n_serial_max}
+        self._used = {k: 0 for k in self.capacity}
         self._threads = set()
-        self._threads_lock = threading.Lock()
-        self._queue = queue.PriorityQueue()
-        self._serial_queue = queue.PriorityQueue()
-        self._serial_queue_lock = threading.Semaphore(n_serial_max)
-        self._n_running = _tval.TInt(0)
+        self._cond = threading.Condition(threading.Lock())
+        self.admission = _AdmissionController(
+            self._cond,
+            load_average=load_average,
+            pressure=pressure,
+            cpu_percent=cpu_percent,
+            interval=admission_interval,
+            log=admission_log,
+            on_admit=self._adjust_threads_locked,
+            measure=learn_mem,
+        )
+        self._queue = []
+        # Heaps of work items keyed by their consumption.
+        self._resource_queue_of = dict()
+        self._n_idle = 0
+        self._n_starting = 0
+        self._n_running = 0
+        self._seq = itertools.count()
+        self._mem_reserved = 0
+        self._on_start = []
+        self._on_stop = []
         self._shutdown = False
 
+    def on_start(self, f):
+        """Register `f()` to be called in each worker thread when the thread starts."""
+        self._on_start.append(f)
+        return f
+
+    def on_stop(self, f):
+        """Register `f()` to be called in each worker thread just before the thread exits."""
+        self._on_stop.append(f)
+        return f
+
+    def resize(self, n_max):
+        if n_max < max(self._n_min, 1):
+            raise ValueError(f"n_max = {n_max} should be at least {max(self._n_min, 1)}")
+        with self._cond:
+            self._n_max = n_max
+            self._adjust_threads_locked()
+
+    def check_resources(self, resources):
+        for k, v in resources.items():
+            if v < 0:
+                raise ValueError(f"Consumption of {k} should not be negative: {v}")
+            if k in self.capacity and v > self.capacity[k]:
+                raise ValueError(
+                    f"Consumption of {k} exceeds the capacity {self.capacity[k]}: {v}"
+                )
+
     def submit(self, wi: _WorkItem):
         logger.debug(wi)
-        if self._shutdown:
-            return
-        if wi.serial:
-            self._serial_queue.put(wi)
-        else:
-            self._queue.put(wi)
-        with self._threads_lock:
-            if len(self._threads) < 1 or (
-                len(self._threads) < self._n_max
-                and os.getloadavg()[0] <= self._load_average
-            ):
-                t = threading.Thread(target=self._worker, daemon=True)
-                self._threads.add(t)
-                t.start()
+        with self._cond:
+            if self._shutdown:
+                return
+            wi.t_submitted = time.monotonic()
+            wi.seq = next(self._seq)
+            if wi.mem:
+                self.admission.track_memory()
+            if wi.mem or any(k in self.capacity for k in wi.resources):
+                heapq.heappush(
+                    self._resource_queue_of.setdefault(
+                        (tuple(sorted(wi.resources.items())), wi.mem), []
+                    ),
+                    wi,
+                )
+            else:
+                heapq.heappush(self._queue, wi)
+            self._adjust_threads_locked()
+            self._cond.notify()
+        self.admission.start()
         return wi.future
 
     def shutdown(self, wait=True):
-        self._shutdown = True
+        self.admission.stop()
+        with self._cond:
+            self._shutdown = True
+            threads = list(self._threads)
+            self._cond.notify_all()
+        if wait:
+            for t in threads:
+                if t is not threading.current_thread():
+                    t.join()
+
+    def _adjust_threads_locked(self):
+        n = max(self._n_min - len(self._threads), 0)
+        if len(self._threads) < 1:
+            n = max(n, 1)
+        if self.admission.ok:
+            n = max(
+                n,
+                min(
+                    self._n_runnable_locked() - self._n_idle - self._n_starting,
+                    self._n_max - len(self._threads),
+                ),
+            )
+        for _ in range(n):
+            self._spawn_locked()
+
+    def _spawn_locked(self):
+        t = threading.Thread(target=self._worker, daemon=True)
+        self._threads.add(t)
+        self._n_starting += 1
+        t.start()
+
+    def _n_runnable_locked(self):
+        return len(self._queue) + sum(
+            len(q) for q in self._resource_queue_of.values() if self._fits_locked(q[0])
+        )
+
+    def _fits_locked(self, wi):
+        return all(
+            self._used[k] + v <= self.capacity[k]
+            for k, v in wi.resources.items()
+            if k in self.capacity
+        ) and (
+            wi.mem <= self.admission.mem_available - self._mem_reserved
+            or self._n_running < 1
+        )
+
+    def _get_locked(self):
+        wi = self._pop_locked()
+        if wi is not None:
+            self._n_running += 1
+            wi.t_wait = time.monotonic() - wi.t_submitted
+            if wi.meter is not None:
+                self.admission.meters.add(wi.meter)
+        return wi
+
+    def _pop_locked(self):
+        if self._n_running > 0 and not self.admission.ok:
+            return None
+        # The first fitting work item in the resource heaps competes with the head of `self._queue`.
+        fit = None
+        if self._resource_queue_of:
+            head = None
+            for k, q in sorted(
+                self._resource_queue_of.items(), key=lambda kq: kq[1][0]
+            ):
+                wi = q[0]
+                if head is None:
+                    head = wi
+                elif head.n_bypassed >= _N_BYPASSED_MAX and (
+                    (head.mem and wi.mem)
+                    or any(r in head.resources for r in wi.resources)
+                ):
+                    # Stop starving `head`.
+                    continue
+                if self._fits_locked(wi):
+                    fit = k, q
+                    break
+        if fit is None or (self._queue and self._queue[0] < fit[1][0]):
+            return heapq.heappop(self._queue) if self._queue else None
+        k, q = fit
+        wi = heapq.heappop(q)
+        if not q:
+            del self._resource_queue_of[k]
+        if wi is not head:
+            head.n_bypassed += 1
+        for r, v in wi.resources.items():
+            if r in self._used:
+                self._used[r] += v
+        self._mem_reserved += wi.mem
+        return wi
+
+    def _release(self, wi):
+        with self._cond:
+            self._n_running -= 1
+            for k, v in wi.resources.items():
+                if k in self._used:
+                    self._used[k] -= v
+            self._mem_reserved -= wi.mem
+            self.admission.meters.discard(wi.meter)
+            if wi.resources or wi.mem or self.admission.enabled:
+                self._cond.notify_all()
+
+    def _get(self):
+        with self._cond:
+            t_idle = time.monotonic() + self._idle_timeout
+            while True:
+                if self._shutdown:
+                    return None
+                wi = self._get_locked()
+                if wi is not None:
+                    return wi
+                timeout = t_idle - time.monotonic()
+                if timeout <= 0 and len(self._threads) > self._n_min:
+                    self._threads.discard(threading.current_thread())
+                    return None
+                self._n_idle += 1
+                try:
+                    self._cond.wait(timeout=timeout if timeout > 0 else None)
+                finally:
+                    self._n_idle -= 1
 
     def _worker(self):
         logger.debug("Start a new worker")
-        # No protection against BuildPy's internal error.
+        with self._cond:
+            self._n_starting -= 1
+        try:
+            for f in self._on_start:
+                f()
+            # No protection against BuildPy's internal error.
+            while True:
+                logger.debug("Try to get a work item")
+                wi = self._get()
+                if wi is None:
+                    break
+                logger.debug("Working on %s", wi)
+                wi()
+                self._release(wi)
+            for f in self._on_stop:
+                f()
+        finally:
+            logger.debug("Stopping a worker")
+            with self._cond:
+                self._threads.discard(threading.current_thread())
+
+
+class _AdmissionController:
+    """
+    Sample the system pressure every `interval` seconds in a dedicated thread and notify `cond` when new jobs become admissible.
+    New jobs are rejected if
+    * the load average exceeds `load_average`,
+    * `some avg10` of `/proc/pressure/<name>` exceeds `pressure[name]`, or
+    * the CPU utilization reported by psutil exceeds `cpu_percent`.
+    Changes of the decision are passed to `log`, and `on_admit()` is called with `cond` held when new jobs become admissible.
+
+    After `track_memory()`, the available memory is sampled to `self.mem_available`, and `cond` is notified at every sampling.
+    If `measure` is true, the peak RSS of each `_MemoryMeter` in `self.meters` is also sampled.
+    """
+
+    def __init__(
+        self,
+        cond,
+        load_average=float("inf"),
+        pressure=None,
+        cpu_percent=float("inf"),
+        interval=1.0,
+        log=None,
+        on_admit=None,
+        measure=False,
+    ):
+        if interval <= 0:
+            raise ValueError(f"interval = {interval} should be positive")
+        self._cond = cond
+        self._load_average = load_average
+        self._pressure = _coalesce(pressure, dict())
+        self._cpu_percent = cpu_percent
+        self._interval = interval
+        self._log = log
+        self._on_admit = on_admit
+        self._measure = measure
+        self._memory = False
+        self.enabled = (
+            math.isfinite(load_average)
+            or bool(self._pressure)
+            or math.isfinite(cpu_percent)
+        )
+        self.ok = True
+        self.mem_available = float("inf")
+        self.meters = set()
+        self._t_rejected = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def track_memory(self):
+        if not self._memory:
+            self.mem_available = psutil.virtual_memory().available
+            self._memory = True
+
+    def start(self):
+        if not (self.enabled or self._memory or self._measure):
+            return
+        with self._lock:
+            if self._thread is not None or self._stopped.is_set():
+                return
+            if math.isfinite(self._cpu_percent):
+                psutil.cpu_percent(interval=None)
+            self._sample()
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _worker(self):
+        while not self._stopped.wait(self._interval):
+            self._sample()
+
+    def _sample(self):
+        state = dict()
+        ok = True
+        if math.isfinite(self._load_average):
+            state["load_average"] = os.getloadavg()[0]
+            ok = ok and state["load_average"] <= self._load_average
+        for name, limit in self._pressure.items():
+            state["pressure_" + name] = _pressure_of(name)
+            ok = ok and state["pressure_" + name] <= limit
+        if math.isfinite(self._cpu_percent):
+            state["cpu_percent"] = psutil.cpu_percent(interval=None)
+            ok = ok and state["cpu_percent"] <= self._cpu_percent
+        if self._memory:
+            mem_available = psutil.virtual_memory().available
+        if self._measure:
+            with self._cond:
+                meters = list(self.meters)
+            for meter in meters:
+                meter.sample()
+        t = time.monotonic()
+        with self._cond:
+            changed = ok != self.ok
+            self.ok = ok
+            if self._memory:
+                self.mem_available = mem_available
+            if ok and (changed or self._memory):
+                if self._on_admit is not None:
+                    self._on_admit()
+                self._cond.notify_all()
+        if changed:
+            logger.info("Admission %s: %s", "resumed" if ok else "paused", state)
+            if ok:
+                state["wait"] = t - self._t_rejected
+            else:
+                self._t_rejected = t
+            if self._log is not None:
+                self._log(dict(admit=ok, **state))
+
+
+class _MemoryMeter:
+    """
+    Peak of the total RSS of the processes started by `sh` in a job (and their descendants).
+    The RSS is sampled by `_AdmissionController`, so the peaks of short-lived processes could be missed.
+    """
+
+    def __init__(self):
+        self.peak = 0
+        self._processes = []
+        self._lock = threading.Lock()
+
+    def add(self, p):
+        try:
+            process = psutil.Process(p.pid)
+        except psutil.Error:
+            return
+        with self._lock:
+            self._processes.append(process)
+
+    def sample(self):
+        with self._lock:
+            processes = list(self._processes)
+        rss = 0
+        for process in processes:
+            try:
+                for pr in [process] + process.children(recursive=True):
+                    rss += pr.memory_info().rss
+            except psutil.Error:
+                pass
+        self.peak = max(self.peak, rss)
+
+
+class _ProcessExecutor:
+    """
+    Run picklable job bodies in worker processes.
+    Worker processes are started by the forkserver (or spawn) method since forking a process running the event loop and executor threads is unsafe.
+    The calling executor thread blocks until the body finishes, so completion is propagated exactly as in the thread mode.
+    """
+
+    def __init__(self, n_max):
+        self._n_max = n_max
+        self._pool = None
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def run(self, j):
+        if sys.version_info < (3, 8):
+            # `_JobBodyPickler` requires `pickle.Pickler.reducer_override`.
+            with self._lock:
+                if not self._warned:
+                    logger.warning(
+                        "executor='process' requires Python 3.8 or later. Job bodies run in the thread executor instead."
+                    )
+                    self._warned = True
+            return j.f(j)
+        try:
+            payload = _dumps_job_body(j.f, _ProcessJob(j))
+        except Exception as e:
+            logger.warning(
+                "Falling back to the thread executor since the job is not picklable: %s: %s",
+                j,
+                e,
+            )
+            return j.f(j)
+        return self._pool_of().submit(_run_job_body, payload).result()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool = self._pool
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _pool_of(self):
+        with self._lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self._n_max,
+                    mp_context=multiprocessing.get_context(
+                        "forkserver" if "forkserver" in methods else "spawn"
+                    ),
+                )
+            return self._pool
+
+
+class _RemoteExecutor:
+    """
+    Forward picklable job bodies and `sh` calls in the other job bodies to `buildpy-worker` agents connecting to `address`.
+    A request is sent to an idle agent, and the calling executor thread blocks until the agent replies.
+    If an agent disconnects before replying, the request is sent to another agent.
+    A request fails if no agent is connected for `timeout` seconds.
+    Only the environment variables in `env_names` are forwarded to agents unless `env` is passed to `sh` explicitly.
+    """
+
+    def __init__(self, address, timeout=60.0, env_names=_REMOTE_ENV_DEFAULT):
+        self.address = address
+        self.timeout = timeout
+        self.env_names = tuple(env_names)
+        self._authkey = _worker.authkey_of_env()
+        if isinstance(address, tuple) and self._authkey is None:
+            raise exception.Err(
+                f"${_worker.AUTHKEY_ENV} should be set to listen on a TCP address: {address}"
+            )
+        self._listener = None
+        self._idle = queue.Queue()
+        self._n_agents = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = multiprocessing.connection.Listener(
+                self.address, authkey=self._authkey
+            )
+        logger.info("Waiting for agents on %s", self.address)
+        threading.Thread(
+            target=self._accept, args=(self._listener,), daemon=True
+        ).start()
+
+    def shutdown(self):
+        with self._lock:
+            listener = self._listener
+        if listener is not None:
+            listener.close()
         while True:
-            if self._shutdown:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
                 break
-            wi = None
-            logger.debug("Try to get a work item")
-            if self._serial_queue_lock.acquire(blocking=False):
-                try:
-                    wi = self._serial_queue.get(block=False)
-                    assert wi.serial
-                except queue.Empty:
-                    self._serial_queue_lock.release()
-            if wi is None:
-                try:
-                    wi = self._queue.get(block=True, timeout=0.01)
-                except queue.Empty:
-                    break
-            logger.debug("Working on %s", wi)
+            conn.close()
 
-            if math.isfinite(self._load_average):
-                while (
-                    self._n_running.val() > 0
-                    and os.getloadavg()[0] > self._load_average
-                ):
-                    time.sleep(1)
-            self._n_running.inc()
-            wi()
-            self._n_running.dec()
-            if wi.serial:
-                self._serial_queue_lock.release()
-        # todo: Do not discard idle threads immediately.
-        logger.debug("Stopping a worker")
-        with self._threads_lock:
-            self._threads.remove(threading.current_thread())
+    def run(self, j, remote):
+        main_path = getattr(sys.modules["__main__"], "__file__", None)
+        try:
+            if main_path is None:
+                raise ValueError("`__main__` is not a file")
+            payload = _dumps_job_body(j.f, _ProcessJob(j))
+        except Exception as e:
+            logger.info(
+                "Forwarding only `sh` calls since the job is not picklable: %s: %s",
+                j,
+                e,
+            )
+            payload = None
+        if payload is None:
+            with _convenience.redirect_sh(functools.partial(self.sh, remote=remote)):
+                return j.f(j)
+        return self._request(
+            "call",
+            dict(
+                payload=payload,
+                main_path=os.path.abspath(main_path),
+                argv=sys.argv,
+                cwd=os.getcwd(),
+            ),
+            remote,
+        )
+
+    def sh(
+        self,
+        s,
+        check,
+        encoding,
+        env,
+        executable,
+        shell,
+        universal_newlines,
+        input,
+        timeout,
+        capture_output,
+        remote,
+        cwd=None,
+        **kwargs,
+    ):
+        if kwargs:
+            raise ValueError(
+                f"{sorted(kwargs)} of `sh` could not be forwarded to an agent: {s}"
+            )
+        returncode, stdout, stderr = self._request(
+            "sh",
+            dict(
+                s=s,
+                cwd=os.path.abspath(_coalesce(cwd, os.curdir)),
+                env=env,
+                environ={k: os.environ[k] for k in self.env_names if k in os.environ},
+                executable=executable,
+                shell=shell,
+                encoding=encoding,
+                universal_newlines=universal_newlines,
+                input=input,
+                timeout=timeout,
+            ),
+            remote,
+        )
+        remote[-1]["returncode"] = returncode
+        if not capture_output:
+            _write_output(sys.stdout, stdout)
+            _write_output(sys.stderr, stderr)
+            stdout = stderr = None
+        if check and returncode:
+            raise subprocess.CalledProcessError(
+                returncode, s, output=stdout, stderr=stderr
+            )
+        return subprocess.CompletedProcess(s, returncode, stdout, stderr)
+
+    def _request(self, kind, x, remote):
+        while True:
+            name, conn = self._idle_agent()
+            try:
+                conn.send((kind, x))
+                status, result, elapsed = conn.recv()
+            except (EOFError, OSError) as e:
+                logger.warning(
+                    "Requeueing a request since agent %s disconnected: %r", name, e
+                )
+                conn.close()
+                with self._lock:
+                    self._n_agents -= 1
+                continue
+            self._idle.put((name, conn))
+            remote.append(dict(agent=name, kind=kind, elapsed=elapsed))
+            if status == "timeout":
+                raise subprocess.TimeoutExpired(*result)
+            elif status == "error":
+                raise exception.Err(f"Agent {name} failed:\n{result}")
+            return result
+
+    def _idle_agent(self):
+        t_limit = time.monotonic() + self.timeout
+        while True:
+            try:
+                return self._idle.get(timeout=_REMOTE_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+            with self._lock:
+                n_agents = self._n_agents
+            if n_agents > 0:  # Busy agents become idle.
+                t_limit = time.monotonic() + self.timeout
+            elif time.monotonic() > t_limit:
+                raise exception.Err(
+                    f"No agent is connected to {self.address} for {self.timeout} seconds"
+                )
+
+    def _accept(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except multiprocessing.AuthenticationError as e:
+                logger.warning("Rejected an agent: %s", e)
+                continue
+            except OSError:  # Closed by `self.shutdown`.
+                return
+            try:
+                kind, name = conn.recv()
+                assert kind == "hello", kind
+            except Exception as e:
+                logger.warning("Rejected an agent: %r", e)
+                conn.close()
+                continue
+            logger.info("Agent %s connected", name)
+            with self._lock:
+                self._n_agents += 1
+            self._idle.put((name, conn))
+
+
+def _write_output(fp, x):
+    if x:
+        if isinstance(x, bytes):
+            fp.buffer.write(x)
+        else:
+            fp.write(x)
+        fp.flush()
+
+
+class _ProcessJob:
+    """
+    A picklable view of a job passed to a body running in a worker process.
+    """
+
+    def __init__(self, j):
+        self.ts = j.ts
+        self.ds = j.ds
+        self.ts_unique = j.ts_unique
+        self.ds_unique = j.ds_unique
+        self.desc = j.desc
+        self.priority = j.priority
+        self.key = j.key
+        self.data = j.data
+        self.ts_prefix = getattr(j, "ts_prefix", "")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({_cdotify(self.ts_unique)}, {_cdotify(self.ds_unique)})"
+
+
+class _JobBodyPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        # `@file(...)` replaces the decorated function with the job in the module namespace, so the function itself is pickled as a reference to the job.
+        if isinstance(obj, types.FunctionType):
+            try:
+                x = sys.modules[obj.__module__]
+                for name in obj.__qualname__.split("."):
+                    x = getattr(x, name)
+            except (KeyError, AttributeError):
+                return NotImplemented
+            if isinstance(x, (_Job, _Jobs)) and x.f is obj:
+                return _job_body_of, (obj.__module__, obj.__qualname__)
+        return NotImplemented
+
+
+class _Jobs(list):
+    f = None
+
+    def __call__(self, f):
+        self.f = f
+        for j in self:
+            j.f = f
+        return self
+
+
+def _list_of_column(xs):
+    # `tolist` converts NumPy arrays (and their elements) to lists of Python objects.
+    return xs.tolist() if hasattr(xs, "tolist") else list(xs)
 
 
 class _WithMeta:
@@ -777,9 +2312,72 @@ def _parse_argv(argv, buildpy_dir=".buildpy"):
     parser.add_argument(
         "-j", "--jobs", type=int, default=1, help="Number of parallel external jobs."
     )
+    parser.add_argument(
+        "--async_jobs",
+        type=int,
+        default=256,
+        help="Number of parallel `async def` job bodies.",
+    )
     parser.add_argument(
         "--n-serial", type=int, default=1, help="Number of parallel serial jobs."
     )
+    parser.add_argument(
+        "--resource",
+        action="append",
+        default=[],
+        help="Capacity of a resource consumed by `@file(resources=dict(name=amount))`. You can specify --resource=name=capacity multiple times.",
+    )
+    parser.add_argument(
+        "--worker_min",
+        type=int,
+        default=0,
+        help="Number of executor threads kept alive even if they are idle.",
+    )
+    parser.add_argument(
+        "--worker_idle_timeout",
+        type=float,
+        default=10.0,
+        help="Seconds an idle executor thread waits for a new job before it exits.",
+    )
+    parser.add_argument(
+        "--executor",
+        default="thread",
+        choices=_EXECUTORS,
+        help="Default executor of file jobs. `process` runs picklable job bodies in worker processes. `remote` runs picklable job bodies, or `sh` calls in the other job bodies, on `buildpy-worker` agents.",
+    )
+    parser.add_argument(
+        "--remote_listen",
+        default=None,
+        help=f"Address (`host:port` or a path to a Unix socket) to wait for `buildpy-worker --connect <address>` agents. The authentication key is read from ${_worker.AUTHKEY_ENV}.",
+    )
+    parser.add_argument(
+        "--remote_timeout",
+        type=float,
+        default=60.0,
+        help="Jobs sent to agents fail if no agent is connected for this many seconds.",
+    )
+    parser.add_argument(
+        "--remote_env",
+        action="append",
+        help=f"Name of an environment variable forwarded to agents by `sh`. You can specify --remote_env=name multiple times. Default: {' '.join(_REMOTE_ENV_DEFAULT)}",
+    )
+    parser.add_argument(
+        "--schedule",
+        default="priority",
+        choices=["priority", "critical-path"],
+        help="Order of ready jobs. `critical-path` prefers jobs on the longest path to the targets estimated from previous execution logs, then `priority`.",
+    )
+    parser.add_argument(
+        "--schedule_history",
+        type=int,
+        default=10,
+        help="Number of previous execution logs used by `--schedule critical-path`.",
+    )
+    parser.add_argument(
+        "--schedule_history_dir",
+        default=None,
+        help="Directory containing previous execution log directories. Defaults to the parent of the execution log directory.",
+    )
     parser.add_argument(
         "-l",
         "--load-average",
@@ -787,6 +2385,30 @@ def _parse_argv(argv, buildpy_dir=".buildpy"):
         default=float("inf"),
         help="No new job is started if there are other running jobs and the load average is higher than the specified value.",
     )
+    parser.add_argument(
+        "--pressure",
+        action="append",
+        default=[],
+        help="No new job is started if there are other running jobs and `some avg10` of /proc/pressure/<name> is higher than the specified value. You can specify --pressure=name=limit (name: cpu, memory, or io) multiple times.",
+    )
+    parser.add_argument(
+        "--cpu_percent",
+        type=float,
+        default=float("inf"),
+        help="No new job is started if there are other running jobs and the CPU utilization is higher than the specified value.",
+    )
+    parser.add_argument(
+        "--admission_interval",
+        type=float,
+        default=1.0,
+        help="Seconds between samplings of the load average, the pressure, and the CPU utilization.",
+    )
+    parser.add_argument(
+        "--learn_mem",
+        type=_bool_of_str,
+        default=False,
+        help="Record the peak RSS of processes started by `sh` in each job, and use the peaks in previous runs as the memory footprints of jobs without `@file(mem=...)`.",
+    )
     parser.add_argument(
         "-k",
         "--keep-going",
@@ -827,10 +2449,27 @@ def _parse_argv(argv, buildpy_dir=".buildpy"):
     parser.add_argument(
         "-n", "--dry-run", action="store_true", default=False, help="Dry-run."
     )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        default=False,
+        help="Keep running, and rebuild jobs downstream of local sources changed (Linux only). Errors do not stop watching as if `--keep-going` is specified.",
+    )
+    parser.add_argument(
+        "--server",
+        default=None,
+        help="Path to a Unix socket to serve `buildpy-client`. Targets, -j, -n, -k, --log, -D, -P, -Q, and -J of clients are used, and the other options are those of the server. Declared jobs and caches are kept in memory between requests.",
+    )
+    parser.add_argument(
+        "--watch_debounce",
+        type=float,
+        default=0.2,
+        help="Seconds without changes `--watch` waits for before a rebuild.",
+    )
     parser.add_argument(
         "--cut",
         action="append",
-        help="Cut the DAG at the job of the specified resource. You can specify --cut=target multiple times.",
+        help="Cut the DAG at the job of the specified resource, which is treated as a source. You can specify --cut=target multiple times.",
     )
     parser.add_argument("--use_hash", type=_bool_of_str, default=True)
     parser.add_argument("--terminate_subprocesses", type=_bool_of_str, default=True)
@@ -850,11 +2489,41 @@ def _parse_argv(argv, buildpy_dir=".buildpy"):
     parser.add_argument(
         "--execution_log_dir_append_id", type=_bool_of_str, default=False
     )
+    parser.add_argument(
+        "--stat_cache",
+        type=_bool_of_str,
+        default=True,
+        help="Share the status of local files among jobs in a run. Missing files in a directory with many dependencies or targets are found by listing the directory once.",
+    )
     parser.add_argument(
         "--resource_hash_dir",
         default=_convenience.jp(buildpy_dir, "resource_hash"),
         help="Directory to store resource hash values.",
     )
+    parser.add_argument(
+        "--resource_hash_store",
+        default="sqlite",
+        choices=sorted(resource.hash_stores),
+        help="Format of `--resource_hash_dir`. `sqlite` stores hash values in a single database, and `dir` stores them in a file per resource.",
+    )
+    parser.add_argument(
+        "--hash_algorithm",
+        default="sha256",
+        choices=resource.HASH_ALGORITHMS,
+        help="Hash algorithm of local files. Files are hashed again if the algorithm is changed.",
+    )
+    parser.add_argument(
+        "--hash_jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of threads hashing dependencies of jobs with `use_hash=True`, and chunks of a file larger than `--hash_chunk_size`.",
+    )
+    parser.add_argument(
+        "--hash_chunk_size",
+        type=_bytes_of,
+        default=0,
+        help="Hash local files larger than this size (e.g. `256M`) as trees of chunks of this size in parallel. 0 disables it.",
+    )
     parser.add_argument(
         "--auto_prefix",
         default=_convenience.jp(buildpy_dir, "auto"),
@@ -864,9 +2533,17 @@ def _parse_argv(argv, buildpy_dir=".buildpy"):
     args = parser.parse_args(argv)
     assert args.jobs > 0
     assert args.n_serial > 0
+    assert 0 <= args.worker_min <= args.jobs
+    assert args.worker_idle_timeout >= 0
     assert args.load_average > 0
     if not args.targets:
         args.targets.append("all")
+    args.resource = dict(_resource_of_str(x) for x in args.resource)
+    args.pressure = dict(_resource_of_str(x) for x in args.pressure)
+    assert all(k in ("cpu", "memory", "io") for k in args.pressure), args.pressure
+    assert args.admission_interval > 0
+    assert args.watch_debounce >= 0
+    assert not (args.watch and args.server), "--watch and --server are exclusive"
     if args.cut is None:
         args.cut = set()
     args.cut = sorted(set(args.cut))
@@ -947,6 +2624,175 @@ def _escape(s: str):
     return '"' + "".join('\\"' if x == '"' else x for x in s) + '"'
 
 
+def _set_ranks(dsl, targets, history):
+    """
+    Set `j.rank` to the estimated duration of the longest path from `j` to any of `targets`.
+    """
+    rank_above = dict()
+    for j in reversed(_postorder_of(dsl, targets)):
+        j.rank = history.get(tuple(j.ts_unique), dict()).get(
+            "elapsed", 0.0
+        ) + rank_above.get(j, 0.0)
+        for d in j.ds_unique:
+            child = dsl._job_of_target(d)
+            if child is not None and rank_above.get(child, 0.0) < j.rank:
+                rank_above[child] = j.rank
+
+
+def _set_mem_estimates(dsl, targets, history):
+    for j in _postorder_of(dsl, targets):
+        j.mem_estimated = history.get(tuple(j.ts_unique), dict()).get("peak_rss", 0)
+
+
+def _postorder_of(dsl, targets):
+    """
+    Return jobs reachable from `targets`, where dependencies precede their dependents.
+    Jobs cut by `--cut` and their dependencies are not reachable.
+    """
+    order = []
+    visited = set()
+    # Jobs declared by `DSL.rule` are materialized here.
+    stack = [
+        (j, False) for j in map(dsl._job_of_target, reversed(targets)) if j is not None
+    ]
+    while stack:
+        j, expanded = stack.pop()
+        if expanded:
+            order.append(j)
+            continue
+        if j in visited:
+            continue
+        visited.add(j)
+        stack.append((j, True))
+        for d in reversed(j.ds_unique):
+            child = dsl._job_of_target(d)
+            if child is not None and child not in visited:
+                stack.append((child, False))
+    return order
+
+
+def _history_of(log_root, n_runs, id_):
+    """
+    Return the mean elapsed time and the maximum peak RSS of each job (keyed by `tuple(j.ts_unique)`) in the last `n_runs` execution logs under `log_root`.
+    Logs of dry-runs are ignored.
+    """
+    if not (n_runs > 0 and log_root and os.path.isdir(log_root)):
+        return dict()
+    runs = []
+    for name in os.listdir(log_root):
+        path = _convenience.jp(log_root, name, "executed.jsonl")
+        if name == id_ or not os.path.isfile(path):
+            continue
+        try:
+            with open(_convenience.jp(log_root, name, "meta.json")) as fp:
+                if json.load(fp)["args"]["dry_run"]:
+                    continue
+        except (OSError, KeyError, ValueError):
+            pass
+        runs.append((os.path.getmtime(path), path))
+    elapseds_of = collections.defaultdict(list)
+    peak_rss_of = dict()
+    for _, path in sorted(runs)[-n_runs:]:
+        with open(path) as fp:
+            for l in fp:
+                try:
+                    x = json.loads(l)
+                except ValueError:  # The last line could be incomplete.
+                    continue
+                k = tuple(_unique_of(x["ts"]))
+                if "elapsed" in x:
+                    elapseds_of[k].append(x["elapsed"])
+                if x.get("peak_rss"):
+                    peak_rss_of[k] = max(peak_rss_of.get(k, 0), x["peak_rss"])
+    history = collections.defaultdict(dict)
+    for k, v in elapseds_of.items():
+        history[k]["elapsed"] = sum(v) / len(v)
+    for k, v in peak_rss_of.items():
+        history[k]["peak_rss"] = v
+    return dict(history)
+
+
+def _watch_dirs(watcher, paths):
+    """
+    Watch the directories of `paths`, and directories in `paths`.
+    Return: the number of directories newly watched.
+    """
+    dirs = set()
+    for path in paths:
+        dirs.add(os.path.dirname(path))
+        if os.path.isdir(path):
+            for root, _, _ in os.walk(path):
+                dirs.add(root)
+    return sum(watcher.add(d) for d in dirs)
+
+
+def _mtime_of_module():
+    mtime_of_module = dict()
+    for m in list(sys.modules.values()):
+        path = getattr(m, "__file__", None)
+        if path:
+            try:
+                mtime_of_module[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+    return mtime_of_module
+
+
+def _is_module_changed(mtime_of_module):
+    for path, t in mtime_of_module.items():
+        try:
+            if os.stat(path).st_mtime_ns != t:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+@contextlib.contextmanager
+def _output_to(conn):
+    """
+    Send what is written to the file descriptors 1 and 2, including outputs of subprocesses, to `conn` as `("out", bytes)` and `("err", bytes)`.
+    """
+    lock = threading.Lock()
+
+    def pump(kind, r):
+        try:
+            while True:
+                x = os.read(r, 2**16)
+                if not x:
+                    break
+                with lock:
+                    conn.send((kind, x))
+        except OSError:  # The client has gone.
+            pass
+        finally:
+            os.close(r)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = []
+    threads = []
+    for fd, kind in ((1, "out"), (2, "err")):
+        r, w = os.pipe()
+        saved.append(os.dup(fd))
+        os.dup2(w, fd)
+        os.close(w)
+        t = threading.Thread(target=pump, args=(kind, r), daemon=True)
+        t.start()
+        threads.append(t)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for fd, fd_saved in zip((1, 2), saved):
+            os.dup2(fd_saved, fd)
+            os.close(fd_saved)
+        # Background processes started by jobs could keep the pipes open.
+        for t in threads:
+            t.join(timeout=1)
+
+
 def _mtime_of(uri, use_hash, credential, resource_hash_dir):
     puri = DSL.uriparse(uri)
     if puri.scheme == "file":
@@ -981,8 +2827,61 @@ def _with_meta(x, **kwargs):
         return _WithMeta(x, **kwargs)
 
 
+def _pressure_of(name):
+    """
+    Return `some avg10` of `/proc/pressure/<name>`, or 0 if PSI is unavailable.
+    """
+    try:
+        with open(f"/proc/pressure/{name}") as fp:
+            for l in fp:
+                kind, *kvs = l.split()
+                if kind == "some":
+                    return float(dict(kv.split("=", 1) for kv in kvs)["avg10"])
+    except OSError:
+        pass
+    return 0.0
+
+
+def _dumps_job_body(f, j):
+    fp = io.BytesIO()
+    _JobBodyPickler(fp).dump((f, j))
+    return fp.getvalue()
+
+
+def _run_job_body(payload):
+    f, j = pickle.loads(payload)
+    f(j)
+
+
+def _job_body_of(module, qualname):
+    if module == "__main__" and "__mp_main__" in sys.modules:
+        # `buildpy-worker` loads `build.py` as `__mp_main__` without replacing its own `__main__`.
+        module = "__mp_main__"
+    x = sys.modules[module]
+    for name in qualname.split("."):
+        x = getattr(x, name)
+    return x.f
+
+
+def _is_process_worker():
+    # `multiprocessing` runs the main script as `__mp_main__` to prepare worker processes.
+    # The parent aliases `__mp_main__` to `__main__`.
+    mp_main = sys.modules.get("__mp_main__")
+    return mp_main is not None and mp_main is not sys.modules.get("__main__")
+
+
 def _event_loop_of():
     loop = asyncio.get_event_loop()
+    if sys.version_info < (3, 12) and hasattr(asyncio, "PidfdChildWatcher"):
+        # The default child watcher before Python 3.12 starts a thread for each process of `DSL.ash`.
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+        except OSError:
+            pass
+        else:
+            watcher = asyncio.PidfdChildWatcher()
+            watcher.attach_loop(loop)
+            asyncio.set_child_watcher(watcher)
     th = threading.Thread(target=loop.run_forever, daemon=True)
     th.start()
     return loop
@@ -1006,11 +2905,13 @@ def _prepend_prefix(prefix, x):
 
 def _de_with_meta(metadata, x):
     def impl(x):
-        if isinstance(x, _WithMeta):
+        if type(x) is str:
+            return sys.intern(x)
+        elif isinstance(x, _WithMeta):
             metadata[x.val] = x.meta
-            return x.val
+            return sys.intern(x.val) if type(x.val) is str else x.val
         elif isinstance(x, list):
-            return [impl(v) for v in x]
+            return [sys.intern(v) if type(v) is str else impl(v) for v in x]
         elif isinstance(x, dict):
             return {k: impl(v) for k, v in x.items()}
         elif isinstance(x, argparse.Namespace):
@@ -1021,36 +2922,65 @@ def _de_with_meta(metadata, x):
     return impl(x)
 
 
+def _de_and_unique_of(metadata, x):
+    """
+    Return: `(_de_with_meta(metadata, x), _unique_of(...))`, computed in a single pass if `x` is a string or a flat list of strings.
+
+    >>> _de_and_unique_of(dict(), ["b", "a", "b"])
+    (['b', 'a', 'b'], ['a', 'b'])
+    >>> metadata = dict()
+    >>> _de_and_unique_of(metadata, ["b", [_WithMeta("a", keep=True)]])
+    (['b', ['a']], ['a', 'b'])
+    >>> metadata
+    {'a': {'keep': True}}
+    """
+    if type(x) is str:
+        x = sys.intern(x)
+        return x, [x]
+    if type(x) is list:
+        try:
+            de = list(map(sys.intern, x))
+        except TypeError:  # Nested lists, dicts, `_WithMeta`, and so on.
+            pass
+        else:
+            unique = sorted(set(de))
+            return de, de if de == unique else unique
+    de = _de_with_meta(metadata, x)
+    return de, _unique_of(de)
+
+
 def _unique_of(xs):
     ret = set()
 
     def impl(x):
-        if isinstance(x, list):
+        if type(x) is str:
+            ret.add(sys.intern(x))
+        elif isinstance(x, list):
             for y in x:
-                impl(y)
+                if type(y) is str:
+                    ret.add(sys.intern(y))
+                else:
+                    impl(y)
         elif isinstance(x, dict):
             for y in x.values():
                 impl(y)
         elif isinstance(x, argparse.Namespace):
             impl(vars(x))
         else:
-            ret.add(x)
+            ret.add(sys.intern(x) if type(x) is str else x)
 
+    if type(xs) is str:
+        return [sys.intern(xs)]
     impl(xs)
-    return sorted(ret)
+    ret = sorted(ret)
+    # Share the list if `xs` is already sorted and unique.
+    return xs if xs == ret else ret
 
 
 def _coalesce(x: typing.Optional[T1], default: T1):
     return default if x is None else x
 
 
-def _contains(v, c):
-    if c:
-        return (c[0] == v) or _contains(v, c[1])
-    else:
-        return False
-
-
 def _set_unique(d: typing.MutableMapping[TK, TV], k: TK, v: TV):
     if k in d:
         raise exception.Err(f"{repr(k)} in {repr(d)}")
@@ -1064,6 +2994,38 @@ def _cdotify(xs):
     return xs
 
 
+def _resource_of_str(x):
+    """
+    >>> _resource_of_str("mem_gb=256")
+    ('mem_gb', 256.0)
+    """
+    k, sep, v = x.partition("=")
+    if not (k and sep):
+        raise ValueError(f"Resource should be specified as name=capacity: {x}")
+    return k, float(v)
+
+
+def _bytes_of(x):
+    """
+    >>> _bytes_of(1024)
+    1024
+    >>> _bytes_of("12G")
+    12884901888
+    >>> _bytes_of("1.5k")
+    1536
+    """
+    if isinstance(x, str):
+        x = x.strip()
+        scale = 1
+        if x and x[-1].upper() in _BYTES_OF_UNIT:
+            scale = _BYTES_OF_UNIT[x[-1].upper()]
+            x = x[:-1]
+        x = float(x) * scale
+    if x < 0:
+        raise ValueError(f"Memory size should not be negative: {x}")
+    return int(x)
+
+
 def _bool_of_str(x):
     if x == "True":
         return True
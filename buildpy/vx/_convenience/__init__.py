@@ -1,4 +1,6 @@
 import argparse
+import asyncio
+import contextlib
 import dataclasses
 import hashlib
 import inspect
@@ -8,11 +10,16 @@ import os
 import shutil
 import subprocess
 import sys
+import threading
 import urllib
 
+import psutil
+
 from .. import exception
 from .._log import logger
 
+_tls = threading.local()
+
 
 @dataclasses.dataclass
 class _URI:
@@ -148,20 +155,200 @@ def sh(
     shell=True,
     universal_newlines=True,
     quiet=False,
+    input=None,
+    timeout=None,
+    capture_output=False,
     **kwargs,
 ):
+    """
+    Same as `subprocess.run` except that the process is passed to the observer of the current thread (see `observe_popen`).
+    The command is passed to the runner of the current thread instead if any (see `redirect_sh`).
+    """
     if not quiet:
         print(s, file=sys.stderr)
-    return subprocess.run(
+    runner = getattr(_tls, "sh_runner", None)
+    if runner is not None:
+        return runner(
+            s,
+            check=check,
+            encoding=encoding,
+            env=env,
+            executable=executable,
+            shell=shell,
+            universal_newlines=universal_newlines,
+            input=input,
+            timeout=timeout,
+            capture_output=capture_output,
+            **kwargs,
+        )
+    if input is not None:
+        if kwargs.get("stdin") is not None:
+            raise ValueError("stdin and input arguments may not both be used.")
+        kwargs["stdin"] = subprocess.PIPE
+    if capture_output:
+        if kwargs.get("stdout") is not None or kwargs.get("stderr") is not None:
+            raise ValueError(
+                "stdout and stderr arguments may not be used with capture_output."
+            )
+        kwargs["stdout"] = subprocess.PIPE
+        kwargs["stderr"] = subprocess.PIPE
+    with subprocess.Popen(
         s,
-        check=check,
         encoding=encoding,
         env=env,
         executable=executable,
         shell=shell,
         universal_newlines=universal_newlines,
         **kwargs,
+    ) as p:
+        observer = getattr(_tls, "popen_observer", None)
+        if observer is not None:
+            observer(p)
+        try:
+            stdout, stderr = p.communicate(input, timeout=timeout)
+        except:  # Including KeyboardInterrupt.
+            p.kill()
+            raise
+        retcode = p.poll()
+    if check and retcode:
+        raise subprocess.CalledProcessError(
+            retcode, p.args, output=stdout, stderr=stderr
+        )
+    return subprocess.CompletedProcess(p.args, retcode, stdout, stderr)
+
+
+async def ash(
+    s,
+    check=True,
+    encoding="utf-8",
+    env=None,
+    executable="/bin/bash",
+    shell=True,
+    quiet=False,
+    input=None,
+    timeout=None,
+    capture_output=False,
+    **kwargs,
+):
+    """
+    An async version of `sh` that does not occupy a thread while the process runs.
+    Outputs of the process are copied to `sys.stdout` and `sys.stderr` as they arrive unless `capture_output` is true.
+    The process and its descendants are killed if the call is cancelled or timed out.
+    """
+    if not quiet:
+        print(s, file=sys.stderr)
+    pipe = asyncio.subprocess.PIPE
+    kwargs = dict(
+        stdin=None if input is None else pipe,
+        stdout=pipe,
+        stderr=pipe,
+        env=env,
+        executable=executable,
+        **kwargs,
     )
+    if shell:
+        p = await asyncio.create_subprocess_shell(s, **kwargs)
+    else:
+        p = await asyncio.create_subprocess_exec(
+            *([s] if isinstance(s, str) else s), **kwargs
+        )
+    if isinstance(input, str):
+        input = input.encode(encoding or "utf-8")
+    stdout = None if capture_output else sys.stdout
+    stderr = None if capture_output else sys.stderr
+    try:
+        stdout, stderr, _ = await asyncio.wait_for(
+            asyncio.gather(
+                _relay(p.stdout, stdout),
+                _relay(p.stderr, stderr),
+                _feed(p.stdin, input),
+            ),
+            timeout,
+        )
+        retcode = await p.wait()
+    except asyncio.TimeoutError:
+        await _kill_process_tree(p)
+        raise subprocess.TimeoutExpired(s, timeout)
+    except BaseException:  # Including asyncio.CancelledError.
+        await _kill_process_tree(p)
+        raise
+    if encoding is not None:
+        stdout = None if stdout is None else stdout.decode(encoding)
+        stderr = None if stderr is None else stderr.decode(encoding)
+    if check and retcode:
+        raise subprocess.CalledProcessError(retcode, s, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(s, retcode, stdout, stderr)
+
+
+async def _relay(stream, fp):
+    """
+    Copy `stream` to `fp` and return `None`, or return the whole content if `fp` is `None`.
+    """
+    buf = []
+    while True:
+        x = await stream.read(2**16)
+        if not x:
+            break
+        if fp is None:
+            buf.append(x)
+        else:
+            fp.buffer.write(x)
+            fp.flush()
+    return None if fp is not None else b"".join(buf)
+
+
+async def _feed(stream, input):
+    if stream is not None:
+        try:
+            stream.write(input)
+            await stream.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        stream.close()
+
+
+async def _kill_process_tree(p):
+    try:
+        ps = psutil.Process(p.pid).children(recursive=True)
+    except psutil.Error:
+        ps = []
+    for x in ps:
+        try:
+            x.kill()
+        except psutil.Error:
+            pass
+    if p.returncode is None:
+        try:
+            p.kill()
+        except ProcessLookupError:
+            pass
+        await p.wait()
+
+
+@contextlib.contextmanager
+def observe_popen(f):
+    """
+    Call `f(p)` for each `subprocess.Popen`, `p`, started by `sh` in the current thread.
+    """
+    old = getattr(_tls, "popen_observer", None)
+    _tls.popen_observer = f
+    try:
+        yield
+    finally:
+        _tls.popen_observer = old
+
+
+@contextlib.contextmanager
+def redirect_sh(f):
+    """
+    Make `sh(s, **kwargs)` in the current thread return `f(s, **kwargs)` instead of starting a process.
+    """
+    old = getattr(_tls, "sh_runner", None)
+    _tls.sh_runner = f
+    try:
+        yield
+    finally:
+        _tls.sh_runner = old
 
 
 def let(f):
@@ -357,7 +544,9 @@ def serialize(x):
 
 
 def dictify(x):
-    if isinstance(x, argparse.Namespace):
+    if type(x) is str:  # Fast path for targets and dependencies.
+        return x
+    elif isinstance(x, argparse.Namespace):
         return dictify(vars(x))
     elif isinstance(x, dict):
         return {k: dictify(v) for k, v in x.items()}
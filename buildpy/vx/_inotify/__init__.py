@@ -0,0 +1,143 @@
+"""
+A minimal binding of inotify(7) for `--watch`.
+
+>>> import tempfile
+>>> with tempfile.TemporaryDirectory() as d:
+...     watcher = Inotify()
+...     watcher.add(d)
+...     with open(os.path.join(d, "a"), "w") as fp:
+...         _ = fp.write("a")
+...     paths = watcher.wait(0.1)
+...     watcher.close()
+...     sorted(set(paths)) == [os.path.join(d, "a")]
+True
+True
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+from .. import exception
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+# Events changing the contents or the metadata of entries of a directory, or the directory itself.
+MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+_EVENT = struct.Struct("iIII")
+_BUF_SIZE = 2**16
+
+_libc = None
+
+
+class Inotify:
+    """
+    Watch directories, and return paths of their entries changed.
+    `None` in the returned paths means that events are lost and any path could have been changed.
+    """
+
+    def __init__(self):
+        libc = _libc_of()
+        fd = libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        self.fd = fd
+        self._path_of_wd = dict()
+
+    def add(self, path):
+        """
+        Watch the directory `path`.
+        Return: `False` if `path` is not a directory or does not exist.
+        """
+        wd = _libc_of().inotify_add_watch(
+            self.fd, os.fsencode(path), MASK | IN_ONLYDIR
+        )
+        if wd < 0:
+            return False
+        self._path_of_wd[wd] = path
+        return True
+
+    def read(self, timeout=None):
+        """
+        Return: paths changed, or an empty list if nothing is changed in `timeout` seconds.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        buf = os.read(self.fd, _BUF_SIZE)
+        paths = []
+        i = 0
+        while i < len(buf):
+            wd, mask, _, n = _EVENT.unpack_from(buf, i)
+            i += _EVENT.size
+            name = os.fsdecode(buf[i : i + n].rstrip(b"\0"))
+            i += n
+            if mask & IN_Q_OVERFLOW:
+                paths.append(None)
+                continue
+            path = self._path_of_wd.get(wd)
+            if mask & IN_IGNORED:
+                self._path_of_wd.pop(wd, None)
+            elif path is not None:
+                paths.append(os.path.join(path, name) if name else path)
+        return paths
+
+    def wait(self, debounce):
+        """
+        Block until a change, then return paths changed until nothing is changed for `debounce` seconds.
+        """
+        paths = []
+        while not paths:
+            paths.extend(self.read())
+        while True:
+            more = self.read(debounce)
+            if not more:
+                return paths
+            paths.extend(more)
+
+    def drain(self):
+        """
+        Return paths changed so far without blocking.
+        """
+        paths = []
+        while True:
+            more = self.read(0)
+            if not more:
+                return paths
+            paths.extend(more)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _libc_of():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise exception.Err("inotify is not available on this platform.")
+        _libc = libc
+    return _libc
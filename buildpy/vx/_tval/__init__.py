@@ -97,6 +97,13 @@ class Cache:
                 self._data[k] = val
                 return val
 
+    def invalidate(self, k):
+        """
+        Make the next `get(k, make_val)` call `make_val` again.
+        """
+        with self._data.lock:
+            self._data.data.pop(k, None)
+
 
 class TInt(TVal):
     def __init__(self, val):
@@ -118,6 +125,19 @@ class NonOverwritableDict(TDict):
                 raise Err(f"Tried to overwrite {k} with {v} for {self}")
             self.data[k] = v
 
+    def update_new(self, kvs):
+        # Nothing is set if a key of `kvs` is duplicated or already in `self`.
+        new = dict()
+        for k, v in kvs:
+            if k in new:
+                raise Err(f"Tried to overwrite {k} with {v} for {self}")
+            new[k] = v
+        with self.lock:
+            for k, v in new.items():
+                if k in self.data:
+                    raise Err(f"Tried to overwrite {k} with {v} for {self}")
+            self.data.update(new)
+
 
 class TListOf:
     def __init__(self):
@@ -151,6 +171,13 @@ class TListOf:
             else:
                 self.data[k] = [v]
 
+    def extend(self, k, vs):
+        with self.lock:
+            if k in self.data:
+                self.data[k].extend(vs)
+            else:
+                self.data[k] = list(vs)
+
     def get(self, k, default=None):
         with self.lock:
             return self.data.get(k, default)
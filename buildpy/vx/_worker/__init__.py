@@ -0,0 +1,140 @@
+"""
+`buildpy-worker`: an agent running shell commands and picklable job bodies for a coordinating `buildpy.vx.DSL`.
+
+    buildpy-worker --connect host:port
+    buildpy-worker --connect /path/to/socket
+
+The coordinator listens on the address given by `--remote_listen` of `build.py`.
+An agent runs one request at a time, so start several agents to run requests in parallel.
+"""
+
+import argparse
+import multiprocessing.connection
+import os
+import pickle
+import runpy
+import socket
+import subprocess
+import sys
+import time
+import traceback
+import types
+
+from .._log import logger
+
+AUTHKEY_ENV = "BUILDPY_WORKER_AUTHKEY"
+
+
+def main(argv=None):
+    args = _parse_argv(sys.argv[1:] if argv is None else argv)
+    name = args.name or f"{socket.gethostname()}:{os.getpid()}"
+    conn = multiprocessing.connection.Client(
+        address_of_str(args.connect), authkey=authkey_of_env()
+    )
+    logger.info("%s connected to %s", name, args.connect)
+    conn.send(("hello", name))
+    while True:
+        try:
+            kind, x = conn.recv()
+        except EOFError:
+            break
+        t1 = time.monotonic()
+        try:
+            if kind == "sh":
+                reply = ("ok", _sh(**x))
+            elif kind == "call":
+                reply = ("ok", _call(**x))
+            else:
+                raise ValueError(f"Unknown request: {kind}")
+        except subprocess.TimeoutExpired as e:
+            # `e.cmd` is the command in a job body for `call`.
+            reply = ("timeout", (e.cmd, e.timeout))
+        except Exception:
+            reply = ("error", traceback.format_exc())
+        try:
+            conn.send((*reply, time.monotonic() - t1))
+        except OSError:
+            break
+    conn.close()
+
+
+def address_of_str(s):
+    """
+    >>> address_of_str("localhost:8080")
+    ('localhost', 8080)
+    >>> address_of_str("[::1]:8080")
+    ('::1', 8080)
+    >>> address_of_str("/tmp/buildpy.sock")
+    '/tmp/buildpy.sock'
+    """
+    host, sep, port = s.rpartition(":")
+    if sep and port.isdigit() and "/" not in s:
+        return (host.strip("[]"), int(port))
+    return s
+
+
+def authkey_of_env():
+    authkey = os.environ.get(AUTHKEY_ENV)
+    return None if authkey is None else authkey.encode()
+
+
+def _sh(
+    s,
+    cwd,
+    env,
+    environ,
+    executable,
+    shell,
+    encoding,
+    universal_newlines,
+    input,
+    timeout,
+):
+    if env is None:
+        # Only `environ` of the coordinator is forwarded.
+        env = {**os.environ, **environ}
+    p = subprocess.run(
+        s,
+        cwd=cwd,
+        env=env,
+        executable=executable,
+        shell=shell,
+        encoding=encoding,
+        universal_newlines=universal_newlines,
+        input=input,
+        timeout=timeout,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return p.returncode, p.stdout, p.stderr
+
+
+_main_of_path = dict()
+
+
+def _call(payload, main_path, argv, cwd):
+    os.chdir(cwd)
+    if main_path not in _main_of_path:
+        # Job bodies are pickled as references to jobs declared in `build.py` (see `buildpy.vx._JobBodyPickler`), so load it as `multiprocessing` does.
+        sys.argv = list(argv)
+        module = types.ModuleType("__mp_main__")
+        module.__dict__.update(runpy.run_path(main_path, run_name="__mp_main__"))
+        sys.modules["__mp_main__"] = module
+        _main_of_path[main_path] = module
+    f, j = pickle.loads(payload)
+    f(j)
+
+
+def _parse_argv(argv):
+    parser = argparse.ArgumentParser(
+        prog="buildpy-worker",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description=f"The authentication key is read from ${AUTHKEY_ENV}.",
+    )
+    parser.add_argument(
+        "--connect",
+        required=True,
+        help="Address of the coordinator (`host:port` or a path to a Unix socket).",
+    )
+    parser.add_argument("--name", default=None, help="Name of this agent in logs.")
+    return parser.parse_args(argv)
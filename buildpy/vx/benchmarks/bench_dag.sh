@@ -0,0 +1,97 @@
+#!/bin/bash
+# @(#) Scheduling overhead per edge of wide, deep, and dense graphs of no-op jobs
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+phony = dsl.phony
+loop = dsl.loop
+
+
+shape = os.environ["SHAPE"]
+n = int(os.environ.get("BUILDPY_BENCH_N", "20000"))
+n_edges = 0
+
+
+if shape == "wide":
+    @loop(range(n))
+    def _(i):
+        phony(f"p{i}", [])
+
+    phony("all", [f"p{i}" for i in range(n)])
+    n_edges = n
+elif shape == "deep":
+    phony("p0", [])
+
+    @loop(range(1, n))
+    def _(i):
+        phony(f"p{i}", [f"p{i - 1}"])
+
+    phony("all", [f"p{n - 1}"])
+    n_edges = n
+elif shape == "dense":
+    # Layers of \`width\` jobs, each of which depends on all jobs in the previous layer.
+    width = 100
+    n_layers = max(n // (width * width), 1)
+
+    @loop(range(width))
+    def _(i):
+        phony(f"p0_{i}", [])
+
+    @loop(range(1, n_layers + 1), range(width))
+    def _(l, i):
+        phony(f"p{l}_{i}", [f"p{l - 1}_{k}" for k in range(width)])
+
+    phony("all", [f"p{n_layers}_{i}" for i in range(width)])
+    n_edges = n_layers * width * width + width
+else:
+    raise ValueError(shape)
+
+
+if __name__ == '__main__':
+    t1 = time.time()
+    dsl.run()
+    t2 = time.time()
+    print(f"{shape}\t{n_edges} edges\t{(t2 - t1) / n_edges * 1e6:.1f} us/edge", file=sys.stderr)
+EOF
+
+for shape in wide deep dense; do
+   SHAPE="$shape" "$PYTHON" build.py -j8 --use_hash False --execution_log_dir ''
+done
+# A chain 100 times deeper than the recursion limit.
+SHAPE=deep BUILDPY_BENCH_N=100000 "$PYTHON" build.py -j8 --use_hash False --execution_log_dir ''
@@ -0,0 +1,73 @@
+#!/bin/bash
+# @(#) Declaration throughput of DSL.files compared with DSL.file
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+files = dsl.files
+
+
+n = int(os.environ.get("BUILDPY_BENCH_N", "200000"))
+k = 4
+
+
+def body(j):
+    pass
+
+
+# Targets and dependencies are made before the measurement.
+ts_a = [f"a/{i}" for i in range(n)]
+ts_b = [f"b/{i}" for i in range(n)]
+ds = [[f"src/{(i + l) % n}" for l in range(k)] for i in range(n)]
+
+
+t0 = time.perf_counter()
+for i in range(n):
+    file(ts_a[i], ds[i], data=i)(body)
+# Include writing the execution log.
+dsl.execution_logger_defined.flush()
+t1 = time.perf_counter()
+files(ts_b, ds, data=range(n))(body)
+dsl.execution_logger_defined.flush()
+t2 = time.perf_counter()
+print(f"file: {n / (t1 - t0):.0f} jobs/s\tfiles: {n / (t2 - t1):.0f} jobs/s", file=sys.stderr)
+EOF
+
+"$PYTHON" build.py --execution_log_dir ''
+"$PYTHON" build.py
@@ -0,0 +1,60 @@
+#!/bin/bash
+# @(#) Throughput of dependency checks with each --resource_hash_store
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > bench.py
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+
+import buildpy.vx.resource
+
+
+n = int(os.environ.get("BUILDPY_BENCH_N", "20000"))
+os.mkdir("src")
+for i in range(n):
+    with open(f"src/{i}", "w") as fp:
+        fp.write(str(i))
+time.sleep(0.01)
+
+
+def check(kind):
+    d = f"hash_{kind}"
+    t1 = time.perf_counter()
+    for i in range(n):
+        buildpy.vx.resource.LocalFile.mtime_of(f"src/{i}", None, True, d)
+    buildpy.vx.resource.flush_hash_stores()
+    return n / (time.perf_counter() - t1)
+
+
+for kind in ["dir", "sqlite"]:
+    buildpy.vx.resource.open_hash_store(f"hash_{kind}", kind)
+    cold = check(kind)
+    warm = check(kind)
+    print(f"{kind}: {cold:.0f} checks/s (hash)\t{warm:.0f} checks/s (cached)", file=sys.stderr)
+EOF
+
+"$PYTHON" bench.py
@@ -0,0 +1,75 @@
+#!/bin/bash
+# @(#) Memory usage per job and per edge of declared jobs
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import gc
+import os
+import sys
+
+import psutil
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+n = int(os.environ.get("BUILDPY_BENCH_N", "200000"))
+k = 8
+
+
+def rss():
+    gc.collect()
+    return psutil.Process().memory_info().rss
+
+
+def body(j):
+    pass
+
+
+# Targets are made by f-strings, so each of them is a new string as in typical build.py files.
+rss0 = rss()
+for i in range(n):
+    file(f"out/{i}", [])(body)
+rss1 = rss()
+for i in range(n):
+    file(f"dep/{i}", [f"out/{(i + l) % n}" for l in range(k)])(body)
+rss2 = rss()
+bytes_per_job = (rss1 - rss0) / n
+bytes_per_edge = (rss2 - rss1 - n * bytes_per_job) / (n * k)
+print(f"{bytes_per_job:.0f} bytes/job\t{bytes_per_edge:.0f} bytes/edge", file=sys.stderr)
+EOF
+
+"$PYTHON" build.py --execution_log_dir ''
+"$PYTHON" build.py
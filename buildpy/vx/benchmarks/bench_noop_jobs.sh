@@ -0,0 +1,67 @@
+#!/bin/bash
+# @(#) Throughput of no-op jobs with and without reusing idle executor threads
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+phony = dsl.phony
+loop = dsl.loop
+
+
+n = int(os.environ.get("BUILDPY_BENCH_N", "5000"))
+
+
+@loop(range(n))
+def _(i):
+    @phony(f"p{i}", [])
+    def _(j):
+        pass
+
+
+phony("all", [f"p{i}" for i in range(n)])
+
+
+if __name__ == '__main__':
+    t1 = time.time()
+    dsl.run()
+    t2 = time.time()
+    print(f"{os.environ['LABEL']}\t{n / (t2 - t1):.0f} jobs/s", file=sys.stderr)
+EOF
+
+LABEL="worker_idle_timeout=0" "$PYTHON" build.py -j8 --use_hash False --execution_log_dir '' --worker_idle_timeout 0
+LABEL="worker_idle_timeout=10" "$PYTHON" build.py -j8 --use_hash False --execution_log_dir ''
@@ -0,0 +1,67 @@
+#!/bin/bash
+# @(#) Throughput of status checks of local files with and without the stat cache
+# BUILDPY_BENCH_N=1000000 for a tree of 1M files.
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > bench.py
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+
+import buildpy.vx.resource
+
+
+n = int(os.environ.get("BUILDPY_BENCH_N", "20000"))
+n_dirs = 10
+n_jobs = 4  # Jobs sharing each dependency.
+for i in range(n_dirs):
+    os.mkdir(f"src{i}")
+for i in range(n):
+    open(f"src{i % n_dirs}/{i}", "w").close()
+
+
+def check(paths):
+    t1 = time.perf_counter()
+    for path in paths:
+        try:
+            buildpy.vx.resource.LocalFile.mtime_of(path, None, False, None)
+        except FileNotFoundError:
+            pass
+    return len(paths) / (time.perf_counter() - t1)
+
+
+deps = [f"src{i % n_dirs}/{i}" for i in range(n)] * n_jobs
+targets = [f"src{i % n_dirs}/{i}.out" for i in range(n)]
+for stat_cache in [None, buildpy.vx.resource.StatCache()]:
+    buildpy.vx.resource.LocalFile.stat_cache = stat_cache
+    name = "stat_cache" if stat_cache else "stat"
+    t = check(deps)
+    print(f"{name}: {t:.0f} checks/s (dependencies shared by {n_jobs} jobs)", file=sys.stderr)
+    t = check(targets)
+    print(f"{name}: {t:.0f} checks/s (missing targets)", file=sys.stderr)
+EOF
+
+"$PYTHON" bench.py
@@ -1,9 +1,14 @@
 import abc
+import atexit
+import concurrent.futures
+import errno
 import fcntl
 import functools
+import hashlib
 import json
-import mmap
 import os
+import sqlite3
+import stat
 import threading
 import time
 
@@ -15,6 +20,13 @@ from .. import _tval
 from .. import _convenience
 from .. import exception
 
+BUF_SIZE = 2**20
+DROP_SIZE = 2**26  # Drop pages from the page cache every 64 MiB.
+RACY_SECONDS = 2  # Upper bound of the granularity of file timestamps.
+HASH_ALGORITHMS = tuple(
+    sorted(x for x in hashlib.algorithms_guaranteed if not x.startswith("shake_"))
+)
+
 
 class Resource(abc.ABC):
     @classmethod
@@ -32,29 +44,153 @@ class Resource(abc.ABC):
     def _check_uri(cls, uri):
         pass
 
+    @classmethod
+    def invalidate(cls, uri):
+        """
+        Forget cached metadata of `uri`, which is (re)created or removed.
+        """
+        pass
+
+    @classmethod
+    def clear_caches(cls):
+        """
+        Forget cached metadata of all resources.
+        """
+        pass
+
 
 class LocalFile(Resource):
 
     exceptions = (OSError,)
     scheme = "file"
+    hash_algorithm = "sha256"  # `--hash_algorithm`
+    hash_chunk_size = 0  # `--hash_chunk_size`
+    hash_jobs = 1  # `--hash_jobs`
+    stat_cache = None  # `--stat_cache`
 
     @classmethod
     def rm(cls, uri, credential):
         puri = cls._check_uri(uri)
-        _convenience.rm(puri.uri)
+        try:
+            _convenience.rm(puri.uri)
+        finally:
+            cls.invalidate(puri.uri)
+
+    @classmethod
+    def stat(cls, path):
+        if cls.stat_cache is None:
+            return os.stat(path)
+        return cls.stat_cache.stat(path)
+
+    @classmethod
+    def invalidate(cls, uri):
+        if cls.stat_cache is not None:
+            cls.stat_cache.invalidate(_convenience.uriparse(uri).uri)
+
+    @classmethod
+    def clear_caches(cls):
+        if cls.stat_cache is not None:
+            cls.stat_cache.clear()
 
     @classmethod
     def mtime_of(cls, uri, credential, use_hash, resource_hash_dir):
         """
         == Returns
         * min(uri_time, cache_time)
+
+        Directories are hashed as Merkle trees of their entries (see `_t_and_h_of_dir`).
         """
         puri = _convenience.uriparse(uri)
-        t_uri = os.path.getmtime(puri.uri)
+        st = cls.stat(puri.uri)
+        if stat.S_ISDIR(st.st_mode):
+            t, _ = cls._t_and_h_of_dir(puri.uri, st, use_hash, resource_hash_dir)
+        else:
+            t, _ = cls._t_and_h_of_file(puri.uri, st, use_hash, resource_hash_dir)
+        return t
+
+    @classmethod
+    def _t_and_h_of_file(cls, path, st, use_hash, resource_hash_dir):
+        t_uri = st.st_mtime
         if not use_hash:
-            return t_uri
-        return _min_of_t_uri_and_t_cache(
-            t_uri, functools.partial(_hash_of_path, puri.uri), puri, resource_hash_dir
+            return t_uri, None
+        if 0 < cls.hash_chunk_size < st.st_size:
+            hash_algorithm = f"{cls.hash_algorithm}-tree{cls.hash_chunk_size}"
+            force_hash = functools.partial(
+                _tree_hash_of_path,
+                path,
+                cls.hash_algorithm,
+                cls.hash_chunk_size,
+                st.st_size,
+                cls.hash_jobs,
+            )
+        else:
+            hash_algorithm = cls.hash_algorithm
+            force_hash = functools.partial(_hash_of_path, path, cls.hash_algorithm)
+        return _t_and_h_of_cache(
+            t_uri,
+            force_hash,
+            (cls.scheme, "localhost", os.path.abspath(path)),
+            resource_hash_dir,
+            hash_algorithm=hash_algorithm,
+            sig=_sig_of_stat(st),
+        )
+
+    @classmethod
+    def _t_and_h_of_dir(cls, path, st, use_hash, resource_hash_dir):
+        """
+        Return: `(t, h)`, where `t` is the effective content-change time of the directory, and `h` is the hash value of the Merkle tree of its entries (`None` unless `use_hash`).
+
+        Without hashing, `t` is the latest modification time of the directory (entries are added or removed) and its entries, which is computed once per run with `--stat_cache`.
+        With hashing, files in the directory are cached as if they are dependencies by themselves, so only changed files are hashed, and `t` is the last time the Merkle tree was changed.
+        Symbolic links are not followed, and their targets are hashed instead.
+        """
+        if not use_hash and cls.stat_cache is not None:
+            return (
+                cls.stat_cache.t_of_tree(
+                    path,
+                    lambda: cls._t_and_h_of_tree(path, st, False, resource_hash_dir)[0],
+                ),
+                None,
+            )
+        return cls._t_and_h_of_tree(path, st, use_hash, resource_hash_dir)
+
+    @classmethod
+    def _t_and_h_of_tree(cls, path, st, use_hash, resource_hash_dir):
+        t_uri = st.st_mtime
+        h = hashlib.new(cls.hash_algorithm) if use_hash else None
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for e in entries:
+            if e.is_symlink():
+                kind = "l"
+                t_e = e.stat(follow_symlinks=False).st_mtime
+                h_e = os.readlink(e.path)
+            elif e.is_dir():
+                kind = "d"
+                t_e, h_e = cls._t_and_h_of_dir(
+                    e.path, e.stat(), use_hash, resource_hash_dir
+                )
+            else:
+                kind = "f"
+                t_e, h_e = cls._t_and_h_of_file(
+                    e.path, e.stat(), use_hash, resource_hash_dir
+                )
+            if t_e > t_uri:
+                t_uri = t_e
+            if use_hash:
+                h.update(f"{kind}\0{e.name}\0{h_e}\0".encode(errors="surrogateescape"))
+        if not use_hash:
+            return t_uri, None
+        hash_algorithm = f"{cls.hash_algorithm}-dir"
+        h_dir = f"{hash_algorithm}:{h.hexdigest()}"
+        # The Merkle tree is computed from the cached hash values of the entries, so it serves as the signature of the directory.
+        return _t_and_h_of_cache(
+            t_uri,
+            lambda: h_dir,
+            (cls.scheme, "localhost", os.path.abspath(path)),
+            resource_hash_dir,
+            hash_algorithm=hash_algorithm,
+            sig=h_dir,
         )
 
     @classmethod
@@ -189,22 +325,33 @@ class GoogleCloudStorage(Resource):
 
 
 class S3(Resource):
+    """
+    Once `list_threshold` objects under a prefix (up to the last `/` of keys) are looked up, `LastModified` and `ETag` of objects directly under the prefix are fetched by `list_objects_v2` at once.
+    Objects not in the listing are looked up by `head_object`.
+    """
 
     exceptions = (botocore.exceptions.ClientError,)
     scheme = "s3"
+    list_threshold = 16
     _tls = threading.local()
+    # Futures of listings. A listing is `None` if the prefix could not be listed.
+    _listing_of_prefix = dict()
+    _n_lookups_of_prefix = dict()
+    _listing_lock = threading.Lock()
 
     @classmethod
     def rm(cls, uri, credential):
         puri = cls._check_uri(uri)
         client = cls._client_of(credential)
-        return client.delete_object(Bucket=puri.netloc, Key=puri.path[1:])
+        try:
+            return client.delete_object(Bucket=puri.netloc, Key=puri.path[1:])
+        finally:
+            cls.invalidate(uri)
 
     @classmethod
     def mtime_of(cls, uri, credential, use_hash, resource_hash_dir):
         puri = cls._check_uri(uri)
-        client = cls._client_of(credential)
-        head = client.head_object(Bucket=puri.netloc, Key=puri.path[1:])
+        head = cls._head_of(puri.netloc, puri.path[1:], credential)
         t_uri = head["LastModified"].timestamp()
         if not use_hash:
             return t_uri
@@ -212,6 +359,78 @@ class S3(Resource):
             t_uri, lambda: head["ETag"], puri, resource_hash_dir
         )
 
+    @classmethod
+    def invalidate(cls, uri):
+        puri = cls._check_uri(uri)
+        key = puri.path[1:]
+        prefix = key.rpartition("/")[0]
+        with cls._listing_lock:
+            fs = [
+                f
+                for (_, bucket, p), f in cls._listing_of_prefix.items()
+                if bucket == puri.netloc and p == prefix
+            ]
+        for f in fs:
+            # A listing in progress could contain the old object.
+            listing = f.result()
+            if listing is not None:
+                listing.pop(key, None)
+
+    @classmethod
+    def clear_caches(cls):
+        with cls._listing_lock:
+            cls._listing_of_prefix.clear()
+            cls._n_lookups_of_prefix.clear()
+
+    @classmethod
+    def _head_of(cls, bucket, key, credential):
+        """
+        Return: `head_object(Bucket=bucket, Key=key)` or the corresponding entry of the listing.
+        """
+        listing = cls._listing_of(bucket, key.rpartition("/")[0], credential)
+        if listing is not None:
+            head = listing.get(key)
+            if head is not None:
+                return head
+        return cls._client_of(credential).head_object(Bucket=bucket, Key=key)
+
+    @classmethod
+    def _listing_of(cls, bucket, prefix, credential):
+        k = (credential, bucket, prefix)
+        with cls._listing_lock:
+            f = cls._listing_of_prefix.get(k)
+            if f is None:
+                n = cls._n_lookups_of_prefix.get(k, 0) + 1
+                cls._n_lookups_of_prefix[k] = n
+                if n < cls.list_threshold:
+                    return None
+                # Lookups under the prefix wait for the listing instead of sending `head_object`.
+                f = concurrent.futures.Future()
+                cls._listing_of_prefix[k] = f
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return f.result()
+        listing = dict()
+        try:
+            paginator = cls._client_of(credential).get_paginator("list_objects_v2")
+            for page in paginator.paginate(
+                Bucket=bucket, Prefix=prefix + "/" if prefix else "", Delimiter="/"
+            ):
+                for x in page.get("Contents", ()):
+                    listing[x["Key"]] = dict(
+                        LastModified=x["LastModified"], ETag=x["ETag"]
+                    )
+        except botocore.exceptions.ClientError as e:
+            logger.info("Failed to list s3://%s/%s: %s", bucket, prefix, e)
+            listing = None
+        except BaseException:
+            f.set_result(None)
+            raise
+        f.set_result(listing)
+        return listing
+
     @classmethod
     def _client_of(cls, credential):
         import boto3
@@ -245,6 +464,177 @@ class S3(Resource):
         return puri
 
 
+class StatCache:
+    """
+    `os.stat` results of local files shared by jobs in a run.
+
+    Once `scan_threshold` files in a directory are looked up, the names in the directory are listed by `os.scandir`, so that missing files (e.g. targets not made yet) are known without `stat` calls.
+    Files in the listing are still `stat`ed since `os.DirEntry` does not cache their status on POSIX systems.
+    Paths (re)created or removed during the run should be passed to `invalidate`.
+    Listings and `stat` results of a directory are not cached if `invalidate` is called for a path in the directory while they are made.
+    Values computed from a whole directory tree by `t_of_tree` are likewise forgotten when a path in the tree is invalidated.
+
+    >>> import contextlib
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as d:
+    ...     cache = StatCache()
+    ...     cache.scan_threshold = 1
+    ...     path = os.path.join(d, "a")
+    ...     try:
+    ...         cache.stat(path)
+    ...     except FileNotFoundError:
+    ...         print("missing")
+    ...     open(path, "w").close()
+    ...     cache.invalidate(path)
+    ...     cache.stat(path).st_size
+    missing
+    0
+
+    >>> with tempfile.TemporaryDirectory() as d:
+    ...     cache = StatCache()
+    ...     cache.scan_threshold = 1
+    ...     path = os.path.join(d, "a")
+    ...     scandir = os.scandir
+    ...     def racy_scandir(d):  # Another thread makes `path` during the listing.
+    ...         with scandir(d) as it:
+    ...             entries = list(it)
+    ...         open(path, "w").close()
+    ...         cache.invalidate(path)
+    ...         return contextlib.nullcontext(entries)
+    ...     os.scandir = racy_scandir
+    ...     try:
+    ...         cache.stat(os.path.join(d, "b"))
+    ...     except FileNotFoundError:
+    ...         print("missing")
+    ...     finally:
+    ...         os.scandir = scandir
+    ...     cache.stat(path).st_size
+    missing
+    0
+
+    >>> cache = StatCache()
+    >>> cache.t_of_tree("d", lambda: 1)
+    1
+    >>> cache.t_of_tree("d", lambda: 2)
+    1
+    >>> cache.invalidate("d/s/a")
+    >>> cache.t_of_tree("d", lambda: 3)
+    3
+    """
+
+    scan_threshold = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stat_of_path = dict()  # `None` for missing files.
+        self._names_of_dir = dict()
+        self._n_lookups_of_dir = dict()
+        self._scanning = set()
+        self._t_of_tree = dict()
+        # Incremented by `invalidate` for each directory containing the path.
+        self._gen_of_dir = dict()
+        self._epoch = 0  # Incremented by `clear`.
+
+    def stat(self, path):
+        # The working directory is not changed during a run, and `os.path.abspath` calls `getcwd`.
+        path = os.path.normpath(path)
+        d, name = os.path.split(path)
+        scan = False
+        with self._lock:
+            st = self._stat_of_path.get(path, _MISSING)
+            if st is _MISSING:
+                gen = (self._epoch, self._gen_of_dir.get(d, 0))
+                names = self._names_of_dir.get(d)
+                listed = None if names is None else name in names
+                if names is None and d not in self._scanning:
+                    n = self._n_lookups_of_dir.get(d, 0) + 1
+                    self._n_lookups_of_dir[d] = n
+                    if n >= self.scan_threshold:
+                        self._scanning.add(d)
+                        scan = True
+        if st is _MISSING:
+            if scan:
+                try:
+                    names = self._scan(d)
+                finally:
+                    with self._lock:
+                        self._scanning.discard(d)
+                listed = None if names is None else name in names
+            if listed is False:
+                st = None
+            else:
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    st = None
+            with self._lock:
+                # Results overlapping `invalidate` could be stale.
+                if gen == (self._epoch, self._gen_of_dir.get(d, 0)):
+                    if scan and names is not None:
+                        self._names_of_dir[d] = names
+                    self._stat_of_path[path] = st
+        if st is None:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        return st
+
+    def t_of_tree(self, path, f):
+        """
+        Return: `f()`, which is computed from the directory tree at `path`, cached until a path in the tree is invalidated.
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            t = self._t_of_tree.get(path)
+            gen = (self._epoch, self._gen_of_dir.get(path, 0))
+        if t is None:
+            t = f()
+            with self._lock:
+                if gen == (self._epoch, self._gen_of_dir.get(path, 0)):
+                    self._t_of_tree[path] = t
+        return t
+
+    def invalidate(self, path):
+        path = os.path.normpath(path)
+        with self._lock:
+            # Directories containing the path could have been created.
+            self._gen_of_dir[path] = self._gen_of_dir.get(path, 0) + 1
+            while True:
+                self._stat_of_path.pop(path, None)
+                self._t_of_tree.pop(path, None)
+                d, name = os.path.split(path)
+                if not name:
+                    break
+                self._gen_of_dir[d] = self._gen_of_dir.get(d, 0) + 1
+                names = self._names_of_dir.get(d)
+                if names is not None:
+                    # The file is `stat`ed again whether it exists or not.
+                    names.add(name)
+                path = d
+
+    def clear(self):
+        with self._lock:
+            self._stat_of_path.clear()
+            self._names_of_dir.clear()
+            self._n_lookups_of_dir.clear()
+            self._t_of_tree.clear()
+            self._gen_of_dir.clear()
+            self._epoch += 1
+
+    def _scan(self, d):
+        """
+        Return: the names in `d`, or `None` if `d` could not be listed.
+        """
+        try:
+            with os.scandir(d or os.curdir) as it:
+                return set(e.name for e in it)
+        except (FileNotFoundError, NotADirectoryError):
+            return set()
+        except OSError:  # Fall back on `stat` calls.
+            return None
+
+
+_MISSING = object()
+
+
 of_scheme = _tval.TDict(dict())
 exceptions = ()
 
@@ -255,68 +645,412 @@ def register(resource):
     exceptions += resource.exceptions
 
 
+def clear_caches():
+    """
+    Forget cached metadata of resources, which are scoped to a run.
+    """
+    for x in of_scheme.values():
+        x.clear_caches()
+
+
 register(LocalFile)
 register(BigQuery)
 register(GoogleCloudStorage)
 register(S3)
 
 
-def _min_of_t_uri_and_t_cache(t_uri, force_hash, puri, resource_hash_dir):
+class HashStore(abc.ABC):
+    """
+    Store of `(t, h, t_verified, sig)` keyed by `(scheme, netloc, path)` of resources, where
+    `t` is the time `h`, the hash value of the resource, was changed,
+    `t_verified` is the last time the resource was confirmed to have `h`, and
+    `sig` is the stat signature of the resource at `t_verified` (or `None`).
+    """
+
+    @abc.abstractmethod
+    def get(self, key):
+        """
+        Return: `(t, h, t_verified, sig)` or `None`.
+        """
+        pass
+
+    @abc.abstractmethod
+    def put(self, key, t, h, sig=None):
+        pass
+
+    @abc.abstractmethod
+    def touch(self, key, sig=None):
+        """
+        Set `t_verified` to the current time.
+        """
+        pass
+
+    def flush(self):
+        pass
+
+
+class DirHashStore(HashStore):
+    """
+    A JSON file per resource at `resource_hash_dir/scheme/netloc/path`, whose modification time is `t_verified`.
+    """
+
+    def __init__(self, resource_hash_dir):
+        self.resource_hash_dir = resource_hash_dir
+
+    def get(self, key):
+        cache_path = self._path_of(key)
+        try:
+            cache_path_stat = os.stat(cache_path)
+            t_cache, h_cache, sig = _load_hash_time_cache(cache_path)
+        except (OSError, KeyError, ValueError):
+            return None
+        return t_cache, h_cache, cache_path_stat.st_mtime, sig
+
+    def put(self, key, t, h, sig=None):
+        _dump_hash_time_cache(self._path_of(key), t, h, sig)
+
+    def touch(self, key, sig=None):
+        # The cache file could be removed since the lookup, and then the next lookup misses.
+        x = self.get(key)
+        if x is None:
+            return
+        if x[3] != sig:
+            self.put(key, x[0], x[1], sig)
+        else:
+            t_now = time.time()
+            try:
+                os.utime(self._path_of(key), (t_now, t_now))
+            except FileNotFoundError:
+                pass
+
+    def _path_of(self, key):
+        return _convenience.jp(self.resource_hash_dir, *key)
+
+
+class SQLiteHashStore(HashStore):
+    """
+    A SQLite database in the WAL mode at `resource_hash_dir/hash.sqlite3`.
+    Readers in each thread have their own connections, and writes are buffered and committed in batches.
+    Caches of `DirHashStore` in `resource_hash_dir` are imported when the database is created.
+    """
+
+    file = "hash.sqlite3"
+    batch_size = 1024
+
+    def __init__(self, resource_hash_dir):
+        self.resource_hash_dir = resource_hash_dir
+        self.path = _convenience.jp(resource_hash_dir, self.file)
+        self._lock = threading.Lock()
+        self._pending = dict()
+        self._tls = threading.local()
+        _convenience.mkdir(resource_hash_dir)
+        self._writer = self._connect()
+        with self._writer:
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS hash (scheme TEXT, netloc TEXT, path TEXT, t REAL, h, t_verified REAL, sig TEXT, PRIMARY KEY (scheme, netloc, path)) WITHOUT ROWID"
+            )
+            if "sig" not in {
+                x[1] for x in self._writer.execute("PRAGMA table_info(hash)")
+            }:
+                self._writer.execute("ALTER TABLE hash ADD COLUMN sig TEXT")
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v)"
+            )
+        self._migrate()
+
+    def get(self, key):
+        with self._lock:
+            x = self._pending.get(key)
+        if x is not None:
+            return x
+        if not hasattr(self._tls, "conn"):
+            self._tls.conn = self._connect()
+        return self._tls.conn.execute(
+            "SELECT t, h, t_verified, sig FROM hash WHERE scheme = ? AND netloc = ? AND path = ?",
+            key,
+        ).fetchone()
+
+    def put(self, key, t, h, sig=None):
+        self._put(key, (t, h, time.time(), sig))
+
+    def touch(self, key, sig=None):
+        t, h, _, _ = self.get(key)
+        self._put(key, (t, h, time.time(), sig))
+
+    def flush(self):
+        with self._lock:
+            rows = [(*k, *v) for k, v in self._pending.items()]
+            if rows:
+                with self._writer:
+                    self._writer.executemany(
+                        "INSERT OR REPLACE INTO hash VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                    )
+            self._pending.clear()
+
+    def _put(self, key, x):
+        with self._lock:
+            self._pending[key] = x
+            n = len(self._pending)
+        if n >= self.batch_size:
+            self.flush()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _migrate(self):
+        with self._writer:
+            # Lock the database to migrate only once even if several processes start at once.
+            self._writer.execute("BEGIN IMMEDIATE")
+            if self._writer.execute(
+                "SELECT v FROM meta WHERE k = 'migrated'"
+            ).fetchone():
+                return
+            old = DirHashStore(self.resource_hash_dir)
+            rows = []
+            for root, _, files in os.walk(self.resource_hash_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    key = os.path.relpath(path, self.resource_hash_dir).split(
+                        os.path.sep, 2
+                    )
+                    if len(key) < 3:  # The database itself.
+                        continue
+                    key = (key[0], key[1], os.path.sep + key[2])
+                    x = old.get(key)
+                    if x is not None:
+                        rows.append((*key, *x))
+            self._writer.executemany(
+                "INSERT OR IGNORE INTO hash VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._writer.execute(
+                "INSERT INTO meta VALUES ('migrated', ?)", (time.time(),)
+            )
+        if rows:
+            logger.info(
+                "Imported %d hash caches to %s. Directories under %s other than %s are no longer used.",
+                len(rows),
+                self.path,
+                self.resource_hash_dir,
+                self.file,
+            )
+
+
+hash_stores = dict(dir=DirHashStore, sqlite=SQLiteHashStore)
+_kind_of_hash_dir = dict()
+_hash_store_of_dir = dict()
+_hash_store_lock = threading.Lock()
+
+
+def open_hash_store(resource_hash_dir, kind):
+    """
+    Use `hash_stores[kind]` for `resource_hash_dir`.
+    The store is created when it is used first.
+    """
+    with _hash_store_lock:
+        _kind_of_hash_dir[resource_hash_dir] = kind
+
+
+def hash_store_of(resource_hash_dir):
+    with _hash_store_lock:
+        if resource_hash_dir not in _hash_store_of_dir:
+            kind = _kind_of_hash_dir.get(resource_hash_dir, "sqlite")
+            _hash_store_of_dir[resource_hash_dir] = hash_stores[kind](resource_hash_dir)
+        return _hash_store_of_dir[resource_hash_dir]
+
+
+@atexit.register
+def flush_hash_stores():
+    with _hash_store_lock:
+        stores = list(_hash_store_of_dir.values())
+    for store in stores:
+        store.flush()
+
+
+def _min_of_t_uri_and_t_cache(
+    t_uri, force_hash, puri, resource_hash_dir, hash_algorithm=None, sig=None
+):
     """
     min(uri_time, cache_time)
+
+    `hash_algorithm` is the algorithm used by `force_hash` if the hash values are computed by buildpy (see `_hash_of_path`).
+    `sig` is the stat signature of the resource (see `_sig_of_stat`).
+    If the signature is given, the resource is not hashed as long as the signature is unchanged, instead of comparing `t_uri` with the time of the last verification.
     """
     assert puri.uri, puri
-    cache_path = _convenience.jp(
-        resource_hash_dir, puri.scheme, puri.netloc, os.path.abspath(puri.uri)
+    key = (puri.scheme, puri.netloc, os.path.abspath(puri.uri))
+    t, _ = _t_and_h_of_cache(
+        t_uri, force_hash, key, resource_hash_dir, hash_algorithm, sig
     )
-    try:
-        cache_path_stat = os.stat(cache_path)
-    except OSError:
-        h_path = force_hash()
-        _dump_hash_time_cache(cache_path, t_uri, h_path)
-        return t_uri
+    return t
+
 
-    try:
-        t_cache, h_cache = _load_hash_time_cache(cache_path)
-    except (OSError, KeyError):
+def _t_and_h_of_cache(
+    t_uri, force_hash, key, resource_hash_dir, hash_algorithm=None, sig=None
+):
+    """
+    Return: `(min(uri_time, cache_time), h)`, where `h` is the hash value of the resource (see `_min_of_t_uri_and_t_cache`).
+    """
+    store = hash_store_of(resource_hash_dir)
+    x = store.get(key)
+    if x is None:
         h_path = force_hash()
-        _dump_hash_time_cache(cache_path, t_uri, h_path)
-        return t_uri
+        store.put(key, t_uri, h_path, sig)
+        return t_uri, h_path
 
-    if cache_path_stat.st_mtime > t_uri:
-        return t_cache
+    t_cache, h_cache, t_verified, sig_cache = x
+    if hash_algorithm is not None and _hash_algorithm_of(h_cache) != hash_algorithm:
+        # The hash values are not comparable, so the resource is assumed to be unchanged only if it has not been modified since the last verification.
+        h_path = force_hash()
+        if (sig is not None and sig == sig_cache) or t_verified > t_uri:
+            store.put(key, t_cache, h_path, sig)
+            return t_cache, h_path
+        else:
+            store.put(key, t_uri, h_path, sig)
+            return t_uri, h_path
+    elif sig is not None and sig == sig_cache and t_uri + RACY_SECONDS < t_verified:
+        # The resource could have been modified after the verification without changing its signature if the verification was made within the granularity of the timestamps (cf. racy-git).
+        return t_cache, h_cache
+    elif sig is None and t_verified > t_uri:
+        return t_cache, h_cache
     else:
         h_path = force_hash()
         if h_path == h_cache:
-            t_now = time.time()
-            os.utime(cache_path, (t_now, t_now))
-            return t_cache
+            store.touch(key, sig)
+            return t_cache, h_cache
         else:
-            _dump_hash_time_cache(cache_path, t_uri, h_path)
-            return t_uri
+            store.put(key, t_uri, h_path, sig)
+            return t_uri, h_path
+
+
+def _sig_of_stat(st):
+    return f"{st.st_ino}:{st.st_dev}:{st.st_size}:{st.st_mtime_ns}:{st.st_ctime_ns}"
 
 
-def _dump_hash_time_cache(cache_path, t_path, h_path):
+def _dump_hash_time_cache(cache_path, t_path, h_path, sig=None):
     logger.debug(cache_path)
     _convenience.mkdir(_convenience.dirname(cache_path))
     with open(cache_path, "w") as fp:
         fcntl.flock(fp, fcntl.LOCK_EX)
-        json.dump(dict(t=t_path, h=h_path), fp)
+        json.dump(dict(t=t_path, h=h_path, sig=sig), fp)
 
 
 def _load_hash_time_cache(cache_path):
     with open(cache_path, "r") as fp:
         fcntl.flock(fp, fcntl.LOCK_EX)
         data = json.load(fp)
-    return data["t"], data["h"]
-
-
-def _hash_of_path(path):
-    logger.debug("%s", path)
-    sz = os.path.getsize(path)
-    if sz == 0:
-        return _convenience.sha256_of(b"")
-    with open(path, "rb") as fp, mmap.mmap(
-        fp.fileno(), sz, access=mmap.ACCESS_READ
-    ) as buf:
-        return _convenience.sha256_of(buf)
+    return data["t"], data["h"], data.get("sig")
+
+
+def _hash_of_path(path, hash_algorithm="sha256", buf_size=BUF_SIZE):
+    """
+    Return: the hex digest prefixed by `hash_algorithm + ":"` unless `hash_algorithm` is SHA-256, the algorithm of older versions.
+    """
+    t1 = time.perf_counter()
+    h = hashlib.new(hash_algorithm)
+    n_read = _update_by_range(h, path, 0, None, buf_size)
+    _log_throughput(path, n_read, time.perf_counter() - t1)
+    if hash_algorithm == "sha256":
+        return h.hexdigest()
+    return hash_algorithm + ":" + h.hexdigest()
+
+
+def _tree_hash_of_path(path, hash_algorithm, chunk_size, size, n_jobs):
+    """
+    Return: the hash value of the concatenated digests of `chunk_size` chunks of the file, which are hashed in parallel.
+    """
+    t1 = time.perf_counter()
+    executor = _chunk_executor_of(n_jobs)
+    fs = [
+        executor.submit(_digest_of_chunk, path, hash_algorithm, offset, chunk_size)
+        for offset in range(0, size, chunk_size)
+    ]
+    h = hashlib.new(hash_algorithm)
+    for f in fs:
+        h.update(f.result())
+    _log_throughput(path, size, time.perf_counter() - t1)
+    return f"{hash_algorithm}-tree{chunk_size}:" + h.hexdigest()
+
+
+def _digest_of_chunk(path, hash_algorithm, offset, size):
+    h = hashlib.new(hash_algorithm)
+    _update_by_range(h, path, offset, size, BUF_SIZE)
+    return h.digest()
+
+
+def _update_by_range(h, path, offset, size, buf_size):
+    """
+    Update `h` by `size` bytes (to the end of the file if `size` is `None`) of the file from `offset`.
+    The file is read sequentially into a fixed-size buffer, and the pages read are dropped from the page cache not to evict hot pages by huge inputs.
+
+    Return: the number of bytes read.
+    """
+    buf = bytearray(buf_size)
+    view = memoryview(buf)
+    n_read = 0
+    n_dropped = 0
+    with open(path, "rb", buffering=0) as fp:
+        fd = fp.fileno()
+        _fadvise(fd, offset, size or 0, "POSIX_FADV_SEQUENTIAL")
+        fp.seek(offset)
+        while size is None or n_read < size:
+            v = view if size is None else view[: size - n_read]
+            if hasattr(os, "preadv"):
+                n = os.preadv(fd, [v], offset + n_read)
+            else:  # E.g. macOS before 11 and Windows.
+                n = fp.readinto(v)
+            if not n:
+                break
+            h.update(view[:n])
+            n_read += n
+            if n_read - n_dropped >= DROP_SIZE:
+                _fadvise(
+                    fd, offset + n_dropped, n_read - n_dropped, "POSIX_FADV_DONTNEED"
+                )
+                n_dropped = n_read
+        if n_read > n_dropped:
+            _fadvise(fd, offset + n_dropped, n_read - n_dropped, "POSIX_FADV_DONTNEED")
+    return n_read
+
+
+def _fadvise(fd, offset, size, advice):
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, offset, size, getattr(os, advice))
+
+
+def _log_throughput(path, n_bytes, dt):
+    logger.debug(
+        "%s: %d bytes in %.3f s (%.3g bytes/s)",
+        path,
+        n_bytes,
+        dt,
+        n_bytes / dt if dt > 0 else float("inf"),
+    )
+
+
+_chunk_executor = None
+_chunk_executor_lock = threading.Lock()
+
+
+def _chunk_executor_of(n_jobs):
+    # Files are hashed on `DSL.hash_executor`, so chunks are hashed on another pool not to wait for tasks queued behind the waiting ones.
+    global _chunk_executor
+    with _chunk_executor_lock:
+        if _chunk_executor is None:
+            _chunk_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=n_jobs, thread_name_prefix="buildpy-chunk"
+            )
+        return _chunk_executor
+
+
+def _hash_algorithm_of(h):
+    """
+    >>> _hash_algorithm_of("blake2b:0123")
+    'blake2b'
+    >>> _hash_algorithm_of("0123")
+    'sha256'
+    """
+    algorithm, sep, _ = h.partition(":") if isinstance(h, str) else ("", "", "")
+    return algorithm if sep else "sha256"
@@ -0,0 +1,84 @@
+#!/bin/bash
+# @(#) Blocked jobs should start as soon as the load average decreases
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import json
+import os
+import sys
+import time
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+phony = dsl.phony
+loop = dsl.loop
+
+
+t0 = time.time()
+
+
+def getloadavg():
+    return (3 if time.time() < t0 + 0.5 else 0, None, None)
+
+os.getloadavg = getloadavg
+
+
+n = 8
+
+
+@loop(range(n))
+def _(i):
+    @phony(f"p{i}", [])
+    def _(j):
+        time.sleep(0.2)
+
+
+phony("all", [f"p{i}" for i in range(n)])
+
+
+if __name__ == '__main__':
+    dsl.run()
+    dt = time.time() - t0
+    assert dt < 1.2, dt
+    time.sleep(0.1)  # Wait for the execution logger.
+    with open(os.path.join(dsl.execution_log_dir, "admission.jsonl")) as fp:
+        xs = [json.loads(l) for l in fp]
+    assert [x["admit"] for x in xs] == [False, True], xs
+    assert 0.3 < xs[1]["wait"] < 1, xs
+    assert xs[0]["load_average"] == 3, xs
+    with open(os.path.join(dsl.execution_log_dir, "done.jsonl")) as fp:
+        waits = sorted(json.loads(l)["wait"] for l in fp)
+    assert 0.3 < waits[-2], waits
+EOF
+
+"$PYTHON" build.py -j8 -l2 --use_hash False --admission_interval 0.05 --pressure cpu=1000 --pressure io=1000 --cpu_percent 1000
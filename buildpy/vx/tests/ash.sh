@@ -0,0 +1,104 @@
+#!/bin/bash
+# @(#) DSL.ash
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+loop = dsl.loop
+
+
+n_threads_max = [0]
+
+
+@loop(range(20))
+def _(i):
+    @file([f"sleep{i}"], [])
+    async def _(j):
+        task = asyncio.ensure_future(dsl.ash(f"sleep 0.5 && echo streamed{i} && touch {j.ts[0]}", quiet=True))
+        await asyncio.sleep(0.3)
+        n_threads_max[0] = max(n_threads_max[0], threading.active_count())
+        await task
+
+
+@file("misc", [])
+async def _(j):
+    p = await dsl.ash("cat && echo err 1>&2", input="in", capture_output=True)
+    assert (p.stdout, p.stderr) == ("in", "err\n"), p
+    p = await dsl.ash("echo \$FOO", capture_output=True, env=dict(os.environ, FOO="foo"))
+    assert p.stdout == "foo\n", p
+    assert (await dsl.ash("exit 3", check=False)).returncode == 3
+    try:
+        await dsl.ash("exit 3")
+    except subprocess.CalledProcessError as e:
+        assert e.returncode == 3, e
+    else:
+        raise AssertionError("CalledProcessError was not raised")
+    try:
+        await dsl.ash("sleep 100 & echo \$! > grandchild && wait", timeout=0.5)
+    except subprocess.TimeoutExpired:
+        pass
+    else:
+        raise AssertionError("TimeoutExpired was not raised")
+    p = await dsl.ash(["/bin/echo", "exec"], shell=False, executable=None, capture_output=True)
+    assert p.stdout == "exec\n", p
+    await dsl.ash(f"touch {j.ts}")
+
+
+phony("all", [f"sleep{i}" for i in range(20)] + ["misc"])
+
+
+if __name__ == '__main__':
+    t1 = time.time()
+    dsl.run()
+    dt = time.time() - t1
+    assert dt < 3, dt
+    # Executor threads are kept alive, so threads started for each process would be observed as a transient increase.
+    assert n_threads_max[0] <= threading.active_count() + 2, (n_threads_max, threading.active_count())
+EOF
+
+"$PYTHON" build.py -j1 --use_hash False > stdout
+[[ "$(grep -c streamed stdout)" = 20 ]]
+sleep 0.1
+# The killed grandchild could remain as a zombie if PID 1 does not reap orphans.
+readonly grandchild="$(cat grandchild)"
+[[ ! -e /proc/"$grandchild" ]] || grep -q '^State:.*zombie' /proc/"$grandchild"/status
@@ -0,0 +1,103 @@
+#!/bin/bash
+# @(#) `async def` job bodies and --async_jobs
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+loop = dsl.loop
+
+
+n = int(os.environ["N"])
+n_running = [0, 0]
+n_threads_max = [0]
+
+
+@loop(range(n))
+def _(i):
+    @file([f"out/{i}"], [])
+    async def _(j):
+        n_running[0] += 1
+        n_running[1] = max(n_running)
+        n_threads_max[0] = max(n_threads_max[0], threading.active_count())
+        await asyncio.sleep(0.3)
+        n_running[0] -= 1
+        os.makedirs("out", exist_ok=True)
+        with open(j.ts[0], "w") as fp:
+            print(i, file=fp)
+
+
+@file("fail", [])
+async def _(j):
+    await asyncio.sleep(0.01)
+    raise RuntimeError("fail in an async body")
+
+
+phony("all", [f"out/{i}" for i in range(n)])
+
+
+if __name__ == '__main__':
+    t1 = time.time()
+    dsl.run()
+    dt = time.time() - t1
+    assert n_running[1] == int(os.environ["EXPECT"]), n_running
+    assert n_threads_max[0] < 50, n_threads_max
+    if n_running[1] == n:
+        assert dt < 2, dt
+EOF
+
+N=500 EXPECT=500 "$PYTHON" build.py -j1 --use_hash False --async_jobs 1000
+[[ "$(ls out | wc -l)" = 500 ]]
+[[ "$(cat out/499)" = 499 ]]
+
+# Up-to-date targets are not remade.
+touch -d '1 hour ago' out/0
+N=500 EXPECT=0 "$PYTHON" build.py -j1 --use_hash False --id run2
+[[ "$(grep -c '"ts": "out/' .buildpy/log/run2/executed.jsonl)" = 0 ]]
+
+rm -fr out
+N=4 EXPECT=2 "$PYTHON" build.py -j8 --use_hash False --async_jobs 2
+
+if N=1 EXPECT=0 "$PYTHON" build.py fail 2>| stderr ; then
+   echo should fail
+   exit 1
+fi
+grep -q "fail in an async body" stderr
@@ -0,0 +1,102 @@
+#!/bin/bash
+# @(#) --schedule critical-path
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+phony = dsl.phony
+loop = dsl.loop
+
+
+@phony("long1", [])
+def _(j):
+    time.sleep(0.3)
+
+
+@phony("long2", ["long1"])
+def _(j):
+    time.sleep(0.3)
+
+
+@loop(range(3))
+def _(i):
+    @phony(f"short{i}", [], priority=-1)
+    def _(j):
+        time.sleep(0.1)
+
+
+phony("all", ["long2", "short0", "short1", "short2"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+
+cat <<EOF > rank.py
+import json
+import os
+import sys
+
+rank_of = dict()
+with open(os.path.join(sys.argv[1], "enqueued.jsonl")) as fp:
+    for l in fp:
+        x = json.loads(l)
+        rank_of[x["ts"]] = x["rank"]
+print(json.dumps(rank_of, sort_keys=True))
+assert rank_of["long1"] > rank_of["long2"] > rank_of["short0"], rank_of
+assert 0.55 < rank_of["long1"], rank_of
+EOF
+
+
+"$PYTHON" build.py --use_hash False --id run1
+"$PYTHON" build.py --use_hash False --id run2 --schedule critical-path
+"$PYTHON" rank.py .buildpy/log/run2
+
+# Dry-runs are ignored.
+"$PYTHON" build.py --use_hash False --id run3 --dry-run > /dev/null
+"$PYTHON" build.py --use_hash False --id run4 --schedule critical-path --schedule_history 1
+"$PYTHON" rank.py .buildpy/log/run4
+
+# No history.
+"$PYTHON" build.py --use_hash False --id run5 --schedule critical-path --schedule_history 0
+if "$PYTHON" rank.py .buildpy/log/run5 > /dev/null 2>&1 ; then
+   echo should fail
+   exit 1
+fi
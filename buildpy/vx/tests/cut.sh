@@ -0,0 +1,148 @@
+#!/bin/bash
+# @(#) --cut and dependency dumps of the reachable jobs
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+@file("a", ["src"])
+def _(j):
+    dsl.sh("echo a >> log && cp src a", quiet=True)
+
+
+@file("b", ["a"])
+def _(j):
+    dsl.sh("echo b >> log && cp a b", quiet=True)
+
+
+@file("c", ["b"])
+def _(j):
+    dsl.sh("echo c >> log && cp b c", quiet=True)
+
+
+@file("z", [])
+def _(j):
+    dsl.sh("echo z >> log && touch z", quiet=True)
+
+
+phony("all", ["c"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+echo 1 > src
+if "$PYTHON" build.py --use_hash False --cut b 2> /dev/null ; then
+   echo should fail since b does not exist
+   exit 1
+fi
+"$PYTHON" build.py --use_hash False
+[[ "$(cat log)" = "$(printf 'a\nb\nc')" ]]
+
+sleep 0.1
+echo 2 >| src
+"$PYTHON" build.py --use_hash False --dry-run >| dry
+grep -q '^a$' dry
+"$PYTHON" build.py --use_hash False --dry-run --cut b >| dry
+if grep -q '^[abc]$' dry ; then
+   echo should not run jobs upstream of the cut
+   exit 1
+fi
+"$PYTHON" build.py --use_hash False --cut b
+[[ "$(cat log)" = "$(printf 'a\nb\nc')" ]]
+
+sleep 0.1
+touch b
+"$PYTHON" build.py --use_hash False --cut a
+[[ "$(cat log)" = "$(printf 'a\nb\nc\nc')" ]]
+[[ "$(cat b)" = 1 ]]
+
+# Dependency dumps are limited to the jobs reachable from the targets.
+"$PYTHON" build.py -P >| deps
+grep -q '^c$' deps
+if grep -q '^z$' deps ; then
+   echo should not print unreachable jobs
+   exit 1
+fi
+"$PYTHON" build.py -P --cut b >| deps
+if grep -q '^a$' deps ; then
+   echo should not print jobs upstream of the cut
+   exit 1
+fi
+"$PYTHON" build.py -J --cut b all | "$PYTHON" -c 'import json, sys; assert [x["ts_unique"] for x in json.load(sys.stdin)] == [["all"], ["c"]]'
+"$PYTHON" build.py z -Q >| deps
+grep -q '"z"' deps
+if grep -q '"all"' deps ; then
+   echo should not print unreachable jobs
+   exit 1
+fi
+
+# The placeholder of a cut target keeps the metadata of the target.
+cat <<EOF > meta.py
+#!/usr/bin/python3
+
+import sys
+
+import buildpy.vx
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+
+
+@dsl.file(dsl.meta("m", credential="secret"), [])
+def _(j):
+    dsl.sh("touch m", quiet=True)
+
+
+@dsl.file("n", ["m"])
+def _(j):
+    with open("n", "w") as fp:
+        print(sorted(dsl.metadata["m"].items()), file=fp)
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+"$PYTHON" meta.py --use_hash False n
+rm -f n
+"$PYTHON" meta.py --use_hash False --cut m n
+[[ "$(cat n)" = "[('credential', 'secret'), ('keep', True)]" ]]
@@ -0,0 +1,81 @@
+#!/bin/bash
+# @(#) Circular dependencies are reported with the full path, and deep chains run without RecursionError
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+phony = dsl.phony
+loop = dsl.loop
+
+
+phony("a", ["b"])
+phony("b", ["c", "d"])
+phony("c", [])
+phony("d", ["e"])
+phony("e", ["b"])
+phony("self", ["self"])
+
+
+n = 2 * sys.getrecursionlimit()  # See buildpy/vx/benchmarks/bench_dag.sh for longer chains.
+phony("p0", [])
+
+
+@loop(range(1, n))
+def _(i):
+    phony(f"p{i}", [f"p{i - 1}"])
+
+
+phony("all", [f"p{n - 1}"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+"$PYTHON" build.py --use_hash False --execution_log_dir ''
+
+if "$PYTHON" build.py a 2>| stderr ; then
+   echo should fail
+   exit 1
+fi
+grep -q "A circular dependency detected: \['b'\] -> \['d'\] -> \['e'\] -> \['b'\]$" stderr
+
+if "$PYTHON" build.py self 2>| stderr ; then
+   echo should fail
+   exit 1
+fi
+grep -q "A circular dependency detected: \['self'\] -> \['self'\]$" stderr
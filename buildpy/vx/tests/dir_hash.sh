@@ -0,0 +1,98 @@
+#!/bin/bash
+# @(#) Directories are hashed as Merkle trees of their entries
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import logging
+import os
+import sys
+
+import buildpy.vx
+
+
+logging.basicConfig()
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+@file("x", ["d"], use_hash=True)
+def _(j):
+    print("x")
+    dsl.sh(f"touch {j.ts}", quiet=True)
+
+
+@file("e", [])
+def _(j):
+    dsl.sh(f"mkdir -p {j.ts} && touch {j.ts}/g", quiet=True)
+
+
+@file("f", ["e"], use_hash=False)
+def _(j):
+    print("f")
+    dsl.sh(f"touch {j.ts}", quiet=True)
+
+
+phony("all", ["x", "f"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+mkdir -p d/s
+echo a > d/a
+echo b > d/s/b
+ln -s a d/l
+touch -h -d '1 hour ago' d/a d/s/b d/l d/s d
+"$PYTHON" build.py --log DEBUG 2>| err
+[[ "$(grep -c 'bytes/s' err)" = 2 ]]
+
+"$PYTHON" build.py --log DEBUG 2>| err
+[[ "$(grep -c 'bytes/s' err)" = 0 ]]
+
+# Only the modified file is hashed again, and the content is unchanged.
+sleep 1.1
+touch d/s/b
+"$PYTHON" build.py --log DEBUG 1>| out 2>| err
+[[ "$(grep -c 'bytes/s' err)" = 1 ]]
+[[ ! -s out ]]
+
+# Removing an entry changes the directory.
+rm d/l
+"$PYTHON" build.py 1>| out
+[[ "$(cat out)" = x ]]
+
+# Modification of a file in a directory target updates the target.
+sleep 1.1
+touch e/g
+"$PYTHON" build.py 1>| out
+[[ "$(cat out)" = f ]]
@@ -0,0 +1,95 @@
+#!/bin/bash
+# @(#) dsl.files declares jobs sharing a body at once
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+files = dsl.files
+phony = dsl.phony
+
+
+class Column:
+    # Mimics NumPy arrays.
+    def __init__(self, xs):
+        self.xs = xs
+
+    def tolist(self):
+        return list(self.xs)
+
+
+n = 5
+
+
+@files(Column([f"src/{i}" for i in range(n)]), data=Column(range(n)))
+def _(j):
+    dsl.sh(f"mkdir -p src && echo {j.data} > {j.ts}", quiet=True)
+
+
+@files([[f"out/{i}.a", f"out/{i}.b"] for i in range(n)], [[f"src/{i}", f"src/{(i + 1) % n}"] for i in range(n)], key="out")
+def _(j):
+    dsl.sh(f"mkdir -p out && cat {' '.join(j.ds)} > {j.ts[0]} && touch {j.ts[1]}", quiet=True)
+
+
+phony("all", [f"out/{i}.b" for i in range(n)])
+
+
+if os.environ.get("DUPLICATE"):
+    files(["x", "y", "x"])
+if os.environ.get("LENGTH"):
+    files(["x", "y"], [[]])
+if os.environ.get("RESOURCES"):
+    files(["x", "y"], resources=dict(gpu=-1))
+
+
+if __name__ == '__main__':
+    assert len(dsl.jobs_of_key["out"]) == n
+    dsl.run()
+EOF
+
+"$PYTHON" build.py -j3
+[[ "$(cat out/4.a)" = "$(printf '4\n0')" ]]
+# `grep -q` could exit before `build.py` writes all the dependencies.
+dependencies="$("$PYTHON" build.py -P)"
+grep -q 'out/4.a' <<< "$dependencies"
+
+for v in DUPLICATE LENGTH RESOURCES; do
+   if env "$v=1" "$PYTHON" build.py 2> /dev/null ; then
+      echo "$v should fail"
+      exit 1
+   fi
+done
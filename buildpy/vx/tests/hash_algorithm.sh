@@ -0,0 +1,96 @@
+#!/bin/bash
+# @(#) --hash_algorithm
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import logging
+import os
+import sys
+
+import buildpy.vx
+
+
+logging.basicConfig()
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+@file("x", ["y", "z"])
+def _(j):
+    dsl.sh(f"echo x >> log && touch {j.ts}", quiet=True)
+
+
+phony("all", ["x"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+cat <<EOF > check.py
+import hashlib
+import os
+import sqlite3
+import sys
+
+algorithm = sys.argv[1]
+conn = sqlite3.connect(".buildpy/resource_hash/hash.sqlite3")
+h = conn.execute("SELECT h FROM hash WHERE path = ?", (os.path.abspath("y"),)).fetchone()[0]
+with open("y", "rb") as fp:
+    expected = hashlib.new(algorithm, fp.read()).hexdigest()
+if algorithm != "sha256":
+    expected = algorithm + ":" + expected
+assert h == expected, (h, expected)
+EOF
+
+head -c 3000000 /dev/urandom > y
+echo z > z
+"$PYTHON" build.py
+"$PYTHON" check.py sha256
+
+# Files not modified since the last verification are hashed again without remaking their dependents.
+"$PYTHON" build.py --hash_algorithm blake2b --log DEBUG 2> err
+"$PYTHON" check.py blake2b
+grep -q 'bytes/s' err
+[[ "$(cat log)" = x ]]
+
+sleep 1.1
+touch y
+"$PYTHON" build.py --hash_algorithm blake2b
+[[ "$(cat log)" = x ]]
+
+# Modified files are considered to be changed if the algorithm is changed.
+sleep 1.1
+touch y
+"$PYTHON" build.py
+"$PYTHON" check.py sha256
+[[ "$(cat log)" = "$(printf 'x\nx')" ]]
@@ -0,0 +1,119 @@
+#!/bin/bash
+# @(#) --hash_jobs and --hash_chunk_size
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import logging
+import os
+import sys
+
+import buildpy.vx
+
+
+logging.basicConfig()
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+loop = dsl.loop
+
+
+n = 50
+
+
+@loop(range(4))
+def _(i):
+    @file(f"x{i}", ["big"] + [f"src/{k}" for k in range(n)])
+    def _(j):
+        dsl.sh(f"echo {j.ts} >> log && touch {j.ts}", quiet=True)
+
+
+phony("all", [f"x{i}" for i in range(4)])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+cat <<EOF > check.py
+import hashlib
+import os
+import sqlite3
+
+conn = sqlite3.connect(".buildpy/resource_hash/hash.sqlite3")
+h = conn.execute("SELECT h FROM hash WHERE path = ?", (os.path.abspath("big"),)).fetchone()[0]
+tree = hashlib.sha256()
+with open("big", "rb") as fp:
+    while True:
+        chunk = fp.read(2**20)
+        if not chunk:
+            break
+        tree.update(hashlib.sha256(chunk).digest())
+assert h == "sha256-tree1048576:" + tree.hexdigest(), h
+EOF
+
+mkdir src
+for k in $(seq 0 49); do echo "$k" > "src/$k"; done
+head -c 5000000 /dev/urandom > big
+
+"$PYTHON" build.py -j4 --hash_jobs 4 --hash_chunk_size 1M --log DEBUG 2> err
+[[ "$(wc -l < log)" = 4 ]]
+"$PYTHON" check.py
+# Each file is hashed only once even though all jobs depend on it.
+[[ "$(grep -c 'bytes/s' err)" = 51 ]]
+
+# Unchanged contents.
+sleep 1.1
+touch big src/0
+"$PYTHON" build.py -j4 --hash_jobs 4 --hash_chunk_size 1M
+[[ "$(wc -l < log)" = 4 ]]
+
+sleep 1.1
+echo more >> src/1
+"$PYTHON" build.py -j4 --hash_jobs 1 --hash_chunk_size 1M
+[[ "$(wc -l < log)" = 8 ]]
+
+# Ranges are read by seek and readinto where os.preadv is unavailable.
+"$PYTHON" - <<EOF
+import hashlib
+import os
+
+import buildpy.vx.resource
+
+def digest_of(offset, size):
+    h = hashlib.sha256()
+    n = buildpy.vx.resource._update_by_range(h, "big", offset, size, 4096)
+    return n, h.hexdigest()
+
+expected = [digest_of(1000, 10000), digest_of(4999000, None)]
+del os.preadv
+assert [digest_of(1000, 10000), digest_of(4999000, None)] == expected, expected
+assert expected[0][0] == 10000 and expected[1][0] == 1000, expected
+EOF
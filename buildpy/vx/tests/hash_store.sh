@@ -0,0 +1,86 @@
+#!/bin/bash
+# @(#) --resource_hash_store and the migration from the directory layout
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+@file("x", ["y", "z"])
+def _(j):
+    dsl.sh(f"echo x >> log && touch {j.ts}", quiet=True)
+
+
+phony("all", ["x"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+cat <<EOF > rows.py
+import sqlite3
+import sys
+
+conn = sqlite3.connect(".buildpy/resource_hash/hash.sqlite3")
+print(conn.execute("SELECT COUNT(*) FROM hash WHERE scheme = 'file' AND netloc = 'localhost'").fetchone()[0])
+EOF
+
+echo y > y
+echo z > z
+"$PYTHON" build.py --resource_hash_store dir
+[[ -f ".buildpy/resource_hash/file/localhost/$(pwd)/y" ]]
+[[ ! -e .buildpy/resource_hash/hash.sqlite3 ]]
+
+# The hash values stored by the dir store are imported, so x is not rebuilt.
+sleep 1.1
+touch y
+"$PYTHON" build.py
+[[ "$(cat log)" = x ]]
+[[ "$("$PYTHON" rows.py)" = 2 ]]
+
+sleep 1.1
+echo more >> y
+"$PYTHON" build.py
+[[ "$(cat log)" = "$(printf 'x\nx')" ]]
+
+sleep 1.1
+touch z
+"$PYTHON" build.py
+[[ "$(cat log)" = "$(printf 'x\nx')" ]]
@@ -0,0 +1,99 @@
+#!/bin/bash
+# @(#) @file(mem=...) and --learn_mem
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+import threading
+import time
+
+import psutil
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+loop = dsl.loop
+
+
+lock = threading.Lock()
+n_running = [0, 0]
+mem = int(0.6 * psutil.virtual_memory().available)
+
+
+@loop(range(2))
+def _(i):
+    @file([f"big{i}"], [], mem=mem)
+    def _(j):
+        with lock:
+            n_running[0] += 1
+            n_running[1] = max(n_running)
+        time.sleep(0.3)
+        with lock:
+            n_running[0] -= 1
+        dsl.sh(f"touch {j.ts[0]}", quiet=True)
+
+
+@file("alloc", [])
+def _(j):
+    dsl.sh("""\$PYTHON -c 'import time; x = bytearray(200 * 2**20); time.sleep(0.5)' && touch alloc""")
+
+
+phony("all", ["big0", "big1"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+    if "alloc" in dsl.args.targets:
+        j = dsl.job_of_target["alloc"]
+        print(j.mem_estimated)
+    else:
+        assert n_running[1] == 1, n_running
+EOF
+
+
+"$PYTHON" build.py -j2 --use_hash False
+
+"$PYTHON" build.py -j2 --use_hash False --id run1 --learn_mem True --admission_interval 0.05 alloc > /dev/null
+cat <<EOF > peak.py
+import json
+with open(".buildpy/log/run1/executed.jsonl") as fp:
+    peak_rss = [json.loads(l)["peak_rss"] for l in fp][0]
+assert 150 * 2**20 < peak_rss, peak_rss
+print(peak_rss)
+EOF
+peak_rss="$("$PYTHON" peak.py)"
+
+rm -f alloc
+[[ "$("$PYTHON" build.py -j2 --use_hash False --id run2 --learn_mem True alloc)" = "$peak_rss" ]]
@@ -0,0 +1,103 @@
+#!/bin/bash
+# @(#) @file(executor="process") and --executor process
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+@file("in_process", [], executor="process", data=dict(n=10))
+def in_process(j):
+    with open(j.ts, "w") as fp:
+        print(os.getpid(), sum(range(j.data["n"])), file=fp)
+
+
+@file("in_thread", [], executor="thread")
+def in_thread(j):
+    with open(j.ts, "w") as fp:
+        print(os.getpid(), file=fp)
+
+
+@dsl.let
+def _():
+    # Local functions are not picklable.
+    @file("fallback", [], executor="process")
+    def fallback(j):
+        with open(j.ts, "w") as fp:
+            print(os.getpid(), file=fp)
+
+
+@file("default", [])
+def default(j):
+    with open(j.ts, "w") as fp:
+        print(os.getpid(), file=fp)
+
+
+@file("fail", [], executor="process")
+def fail(j):
+    raise RuntimeError("fail in a worker process")
+
+
+phony("all", ["in_process", "in_thread", "fallback", "default"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+
+"$PYTHON" build.py -j2 --use_hash False 2> stderr
+read in_process_pid total < in_process
+[[ "$total" = 45 ]]
+[[ "$(head -n1 in_thread)" != "$in_process_pid" ]]
+[[ "$(head -n1 fallback)" = "$(head -n1 in_thread)" ]]
+[[ "$(head -n1 default)" = "$(head -n1 in_thread)" ]]
+grep -q "Falling back to the thread executor" stderr
+[[ "$(ls .buildpy/log | wc -l)" = 1 ]]
+
+rm -f default in_thread
+"$PYTHON" build.py -j2 --use_hash False --executor process default in_thread
+[[ "$(head -n1 default)" != "$(head -n1 in_thread)" ]]
+
+if "$PYTHON" build.py fail 2>| stderr ; then
+   echo should fail
+   exit 1
+fi
+grep -q "fail in a worker process" stderr
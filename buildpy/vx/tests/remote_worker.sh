@@ -0,0 +1,167 @@
+#!/bin/bash
+# @(#) --executor remote with several buildpy-worker agents on localhost
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   jobs -p | xargs -r kill 2> /dev/null || :
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import json
+import os
+import sys
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+loop = dsl.loop
+
+
+@loop(range(6))
+def _(i):
+    @file([f"sh{i}"], [])
+    def _(j):
+        dsl.sh(f"sleep 0.3 && echo \$PPID > {j.ts[0]}")
+
+
+@loop(["env"])
+def _(t):
+    @file([t], [])
+    def _(j):
+        # Only the environment variables specified by --remote_env are forwarded.
+        dsl.sh(f"[[ -z \${{BUILDPY_TEST_SECRET:-}} && \$SHELLOPTS = *pipefail* ]] && touch {j.ts[0]}")
+
+
+@file("call", [], data=dict(n=10))
+def call(j):
+    with open(j.ts, "w") as fp:
+        print(os.getpid(), sum(range(j.data["n"])), file=fp)
+
+
+@file("crash", [])
+def _(j):
+    # The first agent running this command is killed.
+    dsl.sh("if [[ ! -e crashed ]]; then touch crashed && kill -9 \$PPID; fi; echo \$PPID >| crash")
+
+
+@file("capture", [])
+def _(j):
+    p = dsl.sh("echo out && echo err 1>&2", capture_output=True)
+    assert (p.stdout, p.stderr) == ("out\n", "err\n"), p
+    assert dsl.sh("exit 3", check=False).returncode == 3
+    dsl.sh(f"touch {j.ts}")
+
+
+@file("fail", [])
+def _(j):
+    dsl.sh("exit 3")
+
+
+@file("timeout", [])
+def timeout(j):
+    dsl.sh("sleep 2", timeout=0.2)
+
+
+phony("all", [f"sh{i}" for i in range(6)] + ["env", "call", "crash", "capture"])
+
+
+if __name__ == '__main__':
+    # Agents running \`call\` load this file as \`__mp_main__\`, so only the coordinator has it.
+    os.environ["BUILDPY_TEST_SECRET"] = "secret"
+    with open("coordinator", "w") as fp:
+        print(os.getpid(), file=fp)
+    dsl.run()
+    if "fail" not in dsl.args.targets:
+        with open(os.path.join(dsl.execution_log_dir, "executed.jsonl")) as fp:
+            xs = [json.loads(l) for l in fp]
+        remote = [r for x in xs for r in x.get("remote", [])]
+        assert {r["kind"] for r in remote} == {"sh", "call"}, remote
+        assert all(r["elapsed"] >= 0 for r in remote), remote
+        assert {r.get("returncode") for r in remote} == {0, 3, None}, remote
+EOF
+
+
+# Agents are started in the background since `build.py` in the background ignores SIGINT used to abort the build.
+start_agents(){
+   rm -f sock
+   {
+      while [[ ! -e sock ]]; do sleep 0.05; done
+      for i in 1 2 3; do
+         "$PYTHON" -m buildpy.vx._worker --connect "$tmp_dir/sock" --name "agent$i" &
+      done
+      wait
+   } 2> /dev/null &
+}
+
+start_agents
+"$PYTHON" build.py -j4 --use_hash False --executor remote --remote_listen "$tmp_dir/sock" 2> stderr
+wait
+
+[[ "$(cat sh* | sort -u | wc -l)" -ge 2 ]]
+[[ -e env ]]
+! grep -q "$(cat coordinator)" sh*
+read call_pid total < call
+[[ "$total" = 45 ]]
+[[ "$call_pid" != "$(cat coordinator)" ]]
+[[ -e crashed ]]
+grep -q "Requeueing a request since agent agent. disconnected" stderr
+[[ ! -e sock ]]
+
+# A TCP address requires an authentication key.
+if "$PYTHON" build.py --use_hash False --executor remote --remote_listen localhost:0 2> /dev/null ; then
+   echo should fail
+   exit 1
+fi
+
+start_agents
+if "$PYTHON" build.py --use_hash False --executor remote --remote_listen "$tmp_dir/sock" fail 2> /dev/null ; then
+   echo should fail
+   exit 1
+fi
+wait
+
+# Timeouts in job bodies run by agents are raised by the coordinator.
+start_agents
+if "$PYTHON" build.py --use_hash False --executor remote --remote_listen "$tmp_dir/sock" timeout 2>| stderr ; then
+   echo should fail
+   exit 1
+fi
+wait
+grep -q "TimeoutExpired: Command 'sleep 2' timed out after" stderr
+! grep -q KeyError stderr
+
+# Jobs fail if no agent connects.
+rm sh0
+if timeout 30 "$PYTHON" build.py --use_hash False --executor remote --remote_listen "$tmp_dir/sock" --remote_timeout 0.5 sh0 2>| stderr ; then
+   echo should fail
+   exit 1
+fi
+grep -q "No agent is connected to" stderr
@@ -0,0 +1,133 @@
+#!/bin/bash
+# @(#) @file(resources=...) and --resource
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+import threading
+import time
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+loop = dsl.loop
+
+
+lock = threading.Lock()
+used = dict(mem=0, gpu=0)
+used_max = dict(mem=0, gpu=0)
+t_start = dict()
+
+
+def consume(j, resources, dt):
+    with lock:
+        t_start[j.ts[0]] = time.time()
+        for k, v in resources.items():
+            used[k] += v
+            used_max[k] = max(used_max[k], used[k])
+    time.sleep(dt)
+    with lock:
+        for k, v in resources.items():
+            used[k] -= v
+    dsl.sh(f"touch {j.ts[0]}", quiet=True)
+
+
+@loop([("a", 3, -2, 1), ("b", 4, -1, 1)] + [(f"s{i}", 1, 0, 0.2) for i in range(3)], tform=lambda x: x)
+def _(t, mem, priority, dt):
+    @file([t], [], resources=dict(mem=mem, unknown=1), priority=priority)
+    def _(j):
+        consume(j, dict(mem=mem), dt)
+
+
+@loop(range(4))
+def _(i):
+    @file([f"g{i}"], [], resources=dict(gpu=1))
+    def _(j):
+        consume(j, dict(gpu=1), 0.3)
+
+
+if "BIG" in os.environ:
+    file(["big"], [], resources=dict(mem=5))
+
+
+phony("all", ["a", "b", "s0", "s1", "s2", "g0", "g1", "g2", "g3"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+    assert used_max == dict(mem=4, gpu=2), used_max
+    assert min(t_start["s0"], t_start["s1"], t_start["s2"]) < t_start["b"], t_start
+EOF
+
+"$PYTHON" build.py -j8 --use_hash False --resource mem=4 --resource gpu=2
+
+if BIG=1 "$PYTHON" build.py -j8 --use_hash False --resource mem=4 2> /dev/null ; then
+   echo should fail
+   exit 1
+fi
+
+# Work items consuming resources do not jump over higher-priority work items that do not.
+cat <<EOF > priority.py
+#!/usr/bin/python3
+
+import sys
+import time
+
+import buildpy.vx
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+order = []
+
+
+@dsl.loop([(f"r{i}", dict(x=1), 100) for i in range(3)] + [(f"p{i}", None, -100) for i in range(3)], tform=lambda x: x)
+def _(t, resources, priority):
+    @dsl.file([t], [], resources=resources, priority=priority)
+    def _(j):
+        order.append(t)
+        time.sleep(0.2)  # Other jobs are queued meanwhile.
+
+
+dsl.phony("all", ["r0", "r1", "r2", "p0", "p1", "p2"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+    # The first job starts before the others are queued.
+    rest = "".join(t[0] for t in order[1:])
+    assert rest == "".join(sorted(rest)), order
+EOF
+
+"$PYTHON" priority.py -j1 --use_hash False --resource x=1
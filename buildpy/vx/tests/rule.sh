@@ -0,0 +1,118 @@
+#!/bin/bash
+# @(#) dsl.rule declares jobs only for needed targets
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+rule = dsl.rule
+
+
+n = 1000000
+called = []
+
+
+@rule(r"out/(\d+)\.txt")
+def _(m):
+    called.append(m[0])
+    i = int(m[1])
+    if i >= n:
+        return
+
+    @file(m[0], [f"src/{i}.txt"])
+    def _(j):
+        dsl.sh(f"mkdir -p out && cp {j.ds[0]} {j.ts}", quiet=True)
+
+
+@rule(r"src/(\d+)\.txt")
+def _(m):
+    @file(m[0], [])
+    def _(j):
+        dsl.sh(f"mkdir -p src && echo {m[1]} > {j.ts}", quiet=True)
+
+
+@rule(r"out/.*")
+def _(m):
+    # Tried if the above rule does not declare a job.
+    @file(m[0], [])
+    def _(j):
+        dsl.sh(f"mkdir -p out && echo fallback > {j.ts}", quiet=True)
+
+
+@rule(r"other/(\d+)\.txt")
+def _(m):
+    # Does not make the target.
+    @file(f"else/{m[1]}.txt", [])
+    def _(j):
+        dsl.sh(f"mkdir -p else && touch {j.ts}", quiet=True)
+
+
+phony("all", ["out/3.txt", "out/7.txt"])
+phony("big", [f"out/{n}.txt"])
+phony("missing", ["nothing/0.txt"])
+phony("other", ["other/0.txt"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+    # 4 phony jobs and at most 4 jobs declared by the rules.
+    assert len(dsl.job_of_target) <= 8, len(dsl.job_of_target)
+    assert called.count("out/3.txt") <= 1, called
+EOF
+
+"$PYTHON" build.py --use_hash False --schedule critical-path
+[[ "$(cat out/3.txt)" = 3 ]]
+[[ "$(cat out/7.txt)" = 7 ]]
+"$PYTHON" build.py --use_hash False big
+[[ "$(cat out/$((1000000)).txt)" = fallback ]]
+"$PYTHON" build.py --use_hash False out/12.txt
+[[ "$(cat out/12.txt)" = 12 ]]
+
+if "$PYTHON" build.py --use_hash False missing 2> /dev/null ; then
+   echo should fail
+   exit 1
+fi
+if "$PYTHON" build.py --use_hash False nothing 2> /dev/null ; then
+   echo should fail
+   exit 1
+fi
+if "$PYTHON" build.py --use_hash False --schedule critical-path other 2> err ; then
+   echo should fail
+   exit 1
+fi
+grep -q 'No rule to make other/0.txt' err
@@ -6,16 +6,20 @@ import sys
 import tempfile
 
 import buildpy.vx
+import buildpy.vx._inotify
+import buildpy.vx._worker
 
 
 def main(argv):
     for mod in [
         buildpy.vx,
         buildpy.vx._convenience,
+        buildpy.vx._inotify,
         buildpy.vx._log,
         buildpy.vx._tval,
         buildpy.vx.exception,
         buildpy.vx.resource,
+        buildpy.vx._worker,
     ]:
         result = doctest.testmod(mod)
         if result.failed > 0:
@@ -0,0 +1,115 @@
+#!/bin/bash
+# @(#) Metadata of S3 objects under a prefix looked up many times are fetched by a listing
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > listing.py
+import collections
+import datetime
+
+import buildpy.vx.resource
+
+
+calls = collections.Counter()
+t = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+objects = {f"p/{i}": dict(LastModified=t, ETag=f'"{i}"') for i in range(40)}
+objects["p/q/0"] = dict(LastModified=t, ETag='"q"')
+
+
+class Paginator:
+    def paginate(self, Bucket, Prefix, Delimiter):
+        calls["list_objects_v2"] += 1
+        assert (Bucket, Prefix, Delimiter) == ("b", "p/", "/")
+        keys = sorted(
+            k for k in objects if k.startswith(Prefix) and "/" not in k[len(Prefix) :]
+        )
+        for i in range(0, len(keys), 10):
+            yield dict(Contents=[dict(Key=k, **objects[k]) for k in keys[i : i + 10]])
+
+
+class Client:
+    def head_object(self, Bucket, Key):
+        calls["head_object"] += 1
+        return objects[Key]
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2", name
+        return Paginator()
+
+    def delete_object(self, Bucket, Key):
+        calls["delete_object"] += 1
+        objects.pop(Key)
+
+
+S3 = buildpy.vx.resource.S3
+S3._client_of = classmethod(lambda cls, credential: Client())
+n = S3.list_threshold
+assert 1 < n < 30, n
+
+
+def mtime_of(key):
+    return S3.mtime_of(f"s3://b/{key}", None, False, None)
+
+
+for i in range(30):
+    assert mtime_of(f"p/{i}") == t.timestamp()
+assert calls == dict(head_object=n - 1, list_objects_v2=1), calls
+
+# Objects in sub-prefixes are not in the listing.
+calls.clear()
+mtime_of("p/q/0")
+mtime_of("p/39")
+assert calls == dict(head_object=1), calls
+
+# Objects made after the listing are looked up by head_object.
+calls.clear()
+objects["p/new"] = dict(LastModified=t, ETag='"new"')
+mtime_of("p/new")
+assert calls == dict(head_object=1), calls
+
+# Targets written by jobs are invalidated.
+calls.clear()
+buildpy.vx.resource.of_scheme["s3"].invalidate("s3://b/p/0")
+mtime_of("p/0")
+mtime_of("p/1")
+assert calls == dict(head_object=1), calls
+
+calls.clear()
+S3.rm("s3://b/p/2", None)
+try:
+    mtime_of("p/2")
+except KeyError:
+    pass
+else:
+    raise AssertionError("p/2 is removed")
+assert calls == dict(delete_object=1, head_object=1), calls
+
+# Listings are made again in the next build.
+calls.clear()
+buildpy.vx.resource.clear_caches()
+for i in range(3, 30):
+    mtime_of(f"p/{i}")
+assert calls == dict(head_object=n - 1, list_objects_v2=1), calls
+EOF
+
+"$PYTHON" listing.py
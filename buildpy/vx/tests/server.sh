@@ -0,0 +1,141 @@
+#!/bin/bash
+# @(#) --server keeps jobs and caches in memory between requests of buildpy-client
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   if [[ -f server.pid ]]; then
+      kill "$(cat server.pid)" || :
+   fi
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import logging
+import os
+import sys
+
+import buildpy.vx
+import buildpy.vx.resource
+
+
+logging.basicConfig()
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+class KV(buildpy.vx.resource.Resource):
+    # A resource other than local files, which is not watched.
+    scheme = "kv"
+    exceptions = (FileNotFoundError,)
+
+    @classmethod
+    def rm(cls, uri, credential):
+        os.remove(cls._check_uri(uri))
+
+    @classmethod
+    def mtime_of(cls, uri, credential, use_hash, resource_hash_dir):
+        return os.stat(cls._check_uri(uri)).st_mtime
+
+    @classmethod
+    def _check_uri(cls, uri):
+        return os.path.join("kv", buildpy.vx.DSL.uriparse(uri).netloc)
+
+
+buildpy.vx.resource.register(KV)
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+@file("x", ["src/y"])
+def _(j):
+    print("x")
+    dsl.sh(f"cp {j.ds[0]} {j.ts[0]}", quiet=True)
+
+
+@file("fail", ["src/y"])
+def _(j):
+    dsl.sh("echo failed 1>&2 && false", quiet=True)
+
+
+@file("z", ["kv://a"])
+def _(j):
+    print("z")
+    dsl.sh(f"cp kv/a {j.ts[0]}", quiet=True)
+
+
+phony("all", ["x"])
+
+
+if __name__ == '__main__':
+    print(os.getpid(), file=open("server.pid", "w"))
+    print("declared", file=open("declared", "a"))
+    dsl.run()
+EOF
+
+client(){
+   "$PYTHON" -m buildpy.vx_client --socket s.sock --build_py build.py --timeout 10 -- "$@"
+}
+
+mkdir src
+echo y1 > src/y
+[[ "$(client)" = x ]]
+[[ "$(cat x)" = y1 ]]
+[[ -S s.sock ]]
+
+# No-op
+[[ -z "$(client)" ]]
+
+# Targets removed are made again.
+rm x
+[[ "$(client)" = x ]]
+[[ "$(cat x)" = y1 ]]
+
+echo y2 >| src/y
+[[ "$(client -n)" = "$(printf 'x\n\tsrc/y\n\nall\n\tx')" ]]
+[[ "$(cat x)" = y1 ]]
+[[ "$(client)" = x ]]
+[[ "$(cat x)" = y2 ]]
+
+# Resources other than local files are checked by every request.
+mkdir kv
+echo a1 > kv/a
+[[ "$(client z)" = z ]]
+[[ -z "$(client z)" ]]
+sleep 0.1  # Timestamps of z and kv/a could be the same within their granularity.
+echo a2 >| kv/a
+[[ "$(client z)" = z ]]
+[[ "$(cat z)" = a2 ]]
+
+# Errors are returned to the client, and the server keeps running.
+if client fail 2> err; then
+   exit 1
+fi
+grep -q failed err
+[[ -z "$(client)" ]]
+[[ "$(wc -l < declared)" = 1 ]]
+
+# The server declares jobs again when build.py is changed.
+echo '# changed' >> build.py
+[[ -z "$(client)" ]]
+[[ "$(wc -l < declared)" = 2 ]]
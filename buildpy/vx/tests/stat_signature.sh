@@ -0,0 +1,91 @@
+#!/bin/bash
+# @(#) Files with unchanged stat signatures are not hashed again
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import logging
+import os
+import sys
+
+import buildpy.vx
+
+
+logging.basicConfig()
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+@file("x", ["y", "z"])
+def _(j):
+    dsl.sh(f"touch {j.ts}", quiet=True)
+
+
+phony("all", ["x"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+cat <<EOF > check.py
+import hashlib
+import os
+import sqlite3
+
+conn = sqlite3.connect(".buildpy/resource_hash/hash.sqlite3")
+h = conn.execute("SELECT h FROM hash WHERE path = ?", (os.path.abspath("y"),)).fetchone()[0]
+with open("y", "rb") as fp:
+    assert h == hashlib.sha256(fp.read()).hexdigest(), h
+EOF
+
+echo y > y
+echo z > z
+touch -d '1 hour ago' y z
+"$PYTHON" build.py --log DEBUG 2>| err
+[[ "$(grep -c 'bytes/s' err)" = 2 ]]
+
+"$PYTHON" build.py --log DEBUG 2>| err
+[[ "$(grep -c 'bytes/s' err)" = 0 ]]
+
+# The modification time is kept, but the signature changes.
+touch -r y ref
+echo more >> y
+touch -r ref y
+"$PYTHON" build.py --log DEBUG 2>| err
+[[ "$(grep -c 'bytes/s' err)" = 1 ]]
+"$PYTHON" check.py
+
+# Files modified just before the last verification are hashed again.
+echo z2 >| z
+"$PYTHON" build.py
+"$PYTHON" build.py --log DEBUG 2>| err
+[[ "$(grep -c 'bytes/s' err)" = 1 ]]
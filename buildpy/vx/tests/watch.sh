@@ -0,0 +1,121 @@
+#!/bin/bash
+# @(#) --watch rebuilds only jobs downstream of changed sources
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+export PYTHONUNBUFFERED=1
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+pid=
+
+finalize(){
+   if [[ -n "$pid" ]]; then
+      kill "$pid" || :
+      wait "$pid" || :
+   fi
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import logging
+import os
+import sys
+
+import buildpy.vx
+
+
+logging.basicConfig()
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+file = dsl.file
+phony = dsl.phony
+
+
+@file("x", ["src/y"])
+def _(j):
+    print("x")
+    dsl.sh(f"cp {j.ds[0]} {j.ts[0]}", quiet=True)
+
+
+@file("w", ["x"])
+def _(j):
+    print("w")
+    dsl.sh(f"cp {j.ds[0]} {j.ts[0]}", quiet=True)
+
+
+@file("u", ["src/v"])
+def _(j):
+    print("u")
+    dsl.sh(f"cp {j.ds[0]} {j.ts[0]}", quiet=True)
+
+
+phony("all", ["w", "u"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+EOF
+
+# Wait until `$1` holds.
+wait_for(){
+   for _ in $(seq 100); do
+      if eval "$1"; then
+         return
+      fi
+      sleep 0.1
+   done
+   echo "Timed out: $1" >&2
+   exit 1
+}
+
+mkdir src
+echo y1 > src/y
+echo v1 > src/v
+"$PYTHON" build.py --log INFO --watch --watch_debounce 0.1 1> out 2> err &
+pid=$!
+wait_for '[[ "$(grep -c Watching err)" = 1 ]]'
+[[ "$(sort out | tr -d '\n')" = uwx ]]
+
+echo y2 >| src/y
+wait_for '[[ "$(grep -c Watching err)" = 2 ]]'
+[[ "$(cat w)" = y2 ]]
+[[ "$(sort out | tr -d '\n')" = uwwxx ]]
+
+# A source removed fails without stopping the watch, and is retried when it is created again.
+rm src/v
+wait_for '[[ "$(grep -c Watching err)" = 3 ]]'
+grep -q 'No rule to make src/v' err
+echo v2 > src/v
+wait_for '[[ "$(grep -c Watching err)" = 4 ]]'
+[[ "$(cat u)" = v2 ]]
+[[ "$(sort out | tr -d '\n')" = uuwwxx ]]
+
+# Targets removed or edited by others make the jobs downstream of them rebuilt.
+rm w
+wait_for '[[ "$(grep -c Watching err)" = 5 ]]'
+[[ "$(cat w)" = y2 ]]
+[[ "$(sort out | tr -d '\n')" = uuwwwxx ]]
+sleep 0.1  # Timestamps of w and x could be the same within their granularity.
+echo x3 >| x
+wait_for '[[ "$(grep -c Watching err)" = 6 ]]'
+[[ "$(cat w)" = x3 ]]
+[[ "$(sort out | tr -d '\n')" = uuwwwwxx ]]
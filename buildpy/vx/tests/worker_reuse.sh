@@ -0,0 +1,83 @@
+#!/bin/bash
+# @(#) Idle executor threads should be reused
+
+# set -xv
+set -o nounset
+set -o errexit
+set -o pipefail
+set -o noclobber
+
+export IFS=$' \t\n'
+export LANG=en_US.UTF-8
+umask u=rwx,g=,o=
+
+readonly tmp_dir="$(mktemp -d)"
+
+finalize(){
+   rm -fr "$tmp_dir"
+}
+
+trap finalize EXIT
+
+
+cd "$tmp_dir"
+
+
+cat <<EOF > build.py
+#!/usr/bin/python3
+
+import os
+import sys
+import threading
+
+import buildpy.vx
+
+
+os.environ["SHELL"] = "/bin/bash"
+os.environ["SHELLOPTS"] = "pipefail:errexit:nounset:noclobber"
+os.environ["PYTHON"] = sys.executable
+
+
+dsl = buildpy.vx.DSL(sys.argv)
+phony = dsl.phony
+loop = dsl.loop
+
+
+started = []
+stopped = []
+tls = threading.local()
+
+
+@dsl.on_worker_start
+def _():
+    tls.started = True
+    started.append(threading.current_thread())
+
+
+@dsl.on_worker_stop
+def _():
+    stopped.append(threading.current_thread())
+
+
+n = 300
+
+
+@loop(range(n))
+def _(i):
+    @phony(f"p{i}", [f"p{i - 1}"] if i > 0 else [])
+    def _(j):
+        assert tls.started, j
+
+
+phony("all", [f"p{n - 1}"])
+
+
+if __name__ == '__main__':
+    dsl.run()
+    assert 1 <= len(started) <= int(os.environ["N_THREADS_MAX"]), started
+    dsl.executor.shutdown(wait=True)
+    assert sorted(map(id, stopped)) == sorted(map(id, started)), (started, stopped)
+EOF
+
+N_THREADS_MAX=4 "$PYTHON" build.py -j4 --use_hash False
+N_THREADS_MAX=4 "$PYTHON" build.py -j4 --use_hash False --worker_min 2
@@ -0,0 +1,116 @@
+"""
+`buildpy-client`: a thin client of `build.py --server <socket>` of `buildpy.vx`.
+
+    buildpy-client --socket .buildpy/server.sock -- all -j 4
+    buildpy-client --socket .buildpy/server.sock --build_py build.py -- all -j 4
+
+Arguments after `--` are forwarded to the server, and outputs of the server are streamed back.
+This package does not import `buildpy.vx`, so that the client starts quickly.
+"""
+
+import argparse
+import multiprocessing.connection
+import os
+import subprocess
+import sys
+import time
+
+
+def main(argv=None):
+    args = _parse_argv(sys.argv[1:] if argv is None else argv)
+    argv = args.argv[1:] if args.argv[:1] == ["--"] else args.argv
+    start = args.build_py is not None
+    t_restart = None  # When the server restarted.
+    while True:
+        conn = _connect(args, start)
+        replied = False
+        with conn:
+            try:
+                conn.send(("run", dict(argv=argv, cwd=os.getcwd())))
+                while True:
+                    kind, x = conn.recv()
+                    replied = True
+                    if kind == "out":
+                        sys.stdout.buffer.write(x)
+                        sys.stdout.buffer.flush()
+                    elif kind == "err":
+                        sys.stderr.buffer.write(x)
+                        sys.stderr.buffer.flush()
+                    elif kind == "exit":
+                        sys.exit(x)
+                    elif kind == "restart":
+                        break
+                    else:
+                        raise ValueError(f"Unknown reply: {kind}")
+            except (EOFError, ConnectionResetError, BrokenPipeError):
+                # The connection could have been accepted by the server restarting.
+                if (
+                    replied
+                    or t_restart is None
+                    or args.timeout < time.monotonic() - t_restart
+                ):
+                    sys.exit("The server has exited.")
+                time.sleep(0.1)
+                continue
+        # The server re-executes itself to declare jobs again.
+        start = False
+        t_restart = time.monotonic()
+
+
+def _connect(args, start):
+    t_limit = time.monotonic() + args.timeout
+    while True:
+        try:
+            return multiprocessing.connection.Client(args.socket, "AF_UNIX")
+        except (FileNotFoundError, ConnectionRefusedError):
+            if start:
+                _start(args)
+                start = False
+            if time.monotonic() > t_limit:
+                raise
+            time.sleep(0.1)
+
+
+def _start(args):
+    log = os.path.join(os.path.dirname(args.socket), "server.log")
+    os.makedirs(os.path.dirname(log) or os.curdir, exist_ok=True)
+    with open(log, "ab") as fp:
+        subprocess.Popen(
+            [args.python, args.build_py, "--server", args.socket],
+            stdin=subprocess.DEVNULL,
+            stdout=fp,
+            stderr=fp,
+            start_new_session=True,
+        )
+
+
+def _parse_argv(argv):
+    parser = argparse.ArgumentParser(
+        prog="buildpy-client",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--socket",
+        default=os.path.join(".buildpy", "server.sock"),
+        help="Unix socket of `build.py --server`.",
+    )
+    parser.add_argument(
+        "--build_py",
+        default=None,
+        help="Start `build.py` as a server if no server is running. Outputs of the server are appended to `server.log` in the directory of `--socket`.",
+    )
+    parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Python interpreter running `--build_py`.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600.0,
+        help="Seconds to wait for the server to be ready.",
+    )
+    parser.add_argument(
+        "argv", nargs=argparse.REMAINDER, help="Arguments of `build.py`."
+    )
+    return parser.parse_args(argv)
@@ -56,10 +56,13 @@ setup(
         "buildpy.v9.resource",
         "buildpy.vx",
         "buildpy.vx._convenience",
+        "buildpy.vx._inotify",
         "buildpy.vx._log",
         "buildpy.vx._tval",
+        "buildpy.vx._worker",
         "buildpy.vx.exception",
         "buildpy.vx.resource",
+        "buildpy.vx_client",
     ],
     install_requires=[
         "boto3 <2",
@@ -71,6 +74,12 @@ setup(
         dev=["mypy", "pyflakes", "black", "pylint", "wheel", "twine", "pytype"]
     ),
     classifiers=["License :: OSI Approved :: GNU General Public License v3 (GPLv3)"],
+    entry_points=dict(
+        console_scripts=[
+            "buildpy-worker = buildpy.vx._worker:main",
+            "buildpy-client = buildpy.vx_client:main",
+        ]
+    ),
     data_files=[(".", ["LICENSE.txt"])],
     zip_safe=True,
 )